@@ -0,0 +1,125 @@
+# Runs a corpus of Brewin test programs in parallel and checks their output.
+# Every NAME.src with a matching NAME.exp is run with console output off (and the lines of
+# NAME.in streamed as input, if present), and get_output() is compared against the .exp lines.
+# Results are printed as each program finishes, so memory stays flat however big the corpus is.
+#
+#   python3 batchrun.py [-j JOBS] [--max-steps N] [--timeout SECONDS] [--engine vm] PATH...
+import argparse
+import concurrent.futures
+import os
+import signal
+import sys
+import time
+
+from intbase import StepLimitExceeded
+from interpreterv1 import Interpreter
+from sources import FileSource
+
+PASS = 'PASS'
+FAIL = 'FAIL'     # ran to completion with the wrong output
+ERROR = 'ERROR'   # raised an error (or crashed) before finishing
+TIMEOUT = 'TIMEOUT' # hit the step or time limit
+
+def find_tests(paths):
+  # yields the .src path of every test with an expected output file
+  for path in paths:
+    if os.path.isfile(path):
+      if path.endswith('.src') and os.path.isfile(path[:-4] + '.exp'):
+        yield path
+      continue
+    for root, dirs, files in os.walk(path):
+      dirs.sort()
+      for name in sorted(files):
+        if name.endswith('.src') and name[:-4] + '.exp' in files:
+          yield os.path.join(root, name)
+
+def read_lines(path):
+  with open(path) as f:
+    return f.read().splitlines()
+
+class _Timeout(Exception):
+  pass
+
+def _on_alarm(signum, frame):
+  raise _Timeout()
+
+def run_test(src_path, engine=Interpreter.REFERENCE_ENGINE, max_steps=None, timeout=None):
+  # returns (src path, status, seconds, detail)
+  in_path = src_path[:-4] + '.in'
+  program = read_lines(src_path)
+  expected = read_lines(src_path[:-4] + '.exp')
+  # input is streamed, so big .in files needn't be read up front
+  source = FileSource(in_path) if os.path.isfile(in_path) else None
+  interpreter = Interpreter(console_output=False, input_source=source, engine=engine)
+
+  # workers run tests on their main thread, so a timer signal can interrupt a runaway program
+  use_alarm = timeout and hasattr(signal, 'setitimer')
+  if use_alarm:
+    signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+  start = time.perf_counter()
+  try:
+    interpreter.run(program, max_steps)
+  except (StepLimitExceeded, _Timeout) as e:
+    return src_path, TIMEOUT, time.perf_counter() - start, str(e) or f'exceeded {timeout}s'
+  except Exception as e:
+    return src_path, ERROR, time.perf_counter() - start, str(e)
+  finally:
+    if use_alarm:
+      signal.setitimer(signal.ITIMER_REAL, 0)
+    if source is not None:
+      source.close()
+  elapsed = time.perf_counter() - start
+
+  output = interpreter.get_output()
+  if output == expected:
+    return src_path, PASS, elapsed, ''
+  for i in range(max(len(output), len(expected))):
+    got = output[i] if i < len(output) else '<missing>'
+    want = expected[i] if i < len(expected) else '<missing>'
+    if got != want:
+      return src_path, FAIL, elapsed, f'line {i+1}: expected {want!r}, got {got!r}'
+
+def run_tests(src_paths, jobs=None, **options):
+  # yields run_test results in completion order, with at most a couple of tests per worker in flight
+  jobs = jobs or os.cpu_count() or 1
+  src_paths = iter(src_paths)
+  with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+    pending = set()
+    while True:
+      while len(pending) < 2 * jobs:
+        src_path = next(src_paths, None)
+        if src_path is None:
+          break
+        pending.add(pool.submit(run_test, src_path, **options))
+      if not pending:
+        return
+      done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+      for future in done:
+        yield future.result()
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Run .src/.exp Brewin test pairs in parallel.')
+  parser.add_argument('paths', nargs='*', default=['.'], help='test files or directories to search')
+  parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: all cores)')
+  parser.add_argument('--max-steps', type=int, default=None, help='statements each program may execute')
+  parser.add_argument('--timeout', type=float, default=None, help='seconds each program may run')
+  parser.add_argument('--engine', default=Interpreter.REFERENCE_ENGINE, choices=[Interpreter.REFERENCE_ENGINE, Interpreter.VM_ENGINE, Interpreter.PYTHON_ENGINE])
+  parser.add_argument('-q', '--quiet', action='store_true', help='only report tests that did not pass')
+  args = parser.parse_args(argv)
+
+  counts = {PASS: 0, FAIL: 0, ERROR: 0, TIMEOUT: 0}
+  start = time.perf_counter()
+  for src_path, status, elapsed, detail in run_tests(find_tests(args.paths), args.jobs, engine=args.engine,
+                                                     max_steps=args.max_steps, timeout=args.timeout):
+    counts[status] += 1
+    if status != PASS or not args.quiet:
+      print(f'{status:<7} {elapsed:8.3f}s  {src_path}' + (f'  {detail}' if detail else ''), flush=True)
+
+  total = sum(counts.values())
+  print(f'{counts[PASS]}/{total} passed, {counts[FAIL]} failed, {counts[ERROR]} errors, '
+        f'{counts[TIMEOUT]} timed out in {time.perf_counter() - start:.2f}s')
+  return 0 if counts[PASS] == total else 1
+
+if __name__ == '__main__':
+  sys.exit(main())
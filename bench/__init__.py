@@ -0,0 +1,7 @@
+# Benchmarks for the Brewin interpreter: synthetic workloads (workloads.py), a runner
+# that times them (runner.py), and a command line for running and comparing results:
+#
+#   python3 -m bench run -o before.json
+#   python3 -m bench compare before.json after.json
+from bench.workloads import WORKLOADS
+from bench.runner import run_workload, run_suite, compare
@@ -0,0 +1,62 @@
+import argparse
+import json
+import sys
+
+from interpreterv1 import Interpreter
+from bench.workloads import WORKLOADS
+from bench.runner import run_suite, compare
+
+def _format(metric, value):
+  if metric == 'peak_bytes':
+    return f'{value / 1024:.0f}KiB'
+  if metric == 'statements_per_s':
+    return f'{value:,.0f}/s'
+  return f'{value:.4f}s'
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog='python3 -m bench', description='Benchmark the Brewin interpreter.')
+  commands = parser.add_subparsers(dest='command', required=True)
+
+  run = commands.add_parser('run', help='run workloads and save the results as JSON')
+  run.add_argument('workloads', nargs='*', help=f'workloads to run (default: all of {", ".join(WORKLOADS)})')
+  run.add_argument('-o', '--output', help='file to write results to (default: stdout)')
+  run.add_argument('--engine', default=Interpreter.REFERENCE_ENGINE, choices=[Interpreter.REFERENCE_ENGINE, Interpreter.VM_ENGINE, Interpreter.PYTHON_ENGINE])
+  run.add_argument('--scale', type=float, default=1.0, help='multiply every workload size by this')
+  run.add_argument('--repeat', type=int, default=3, help='timed runs per workload, the best one is kept')
+  run.add_argument('--cache', action='store_true', help='allow the on-disk program cache (off to measure loading)')
+
+  cmp = commands.add_parser('compare', help='compare two result files')
+  cmp.add_argument('old')
+  cmp.add_argument('new')
+  cmp.add_argument('--threshold', type=float, default=0.10, help='relative slowdown reported as a regression')
+  args = parser.parse_args(argv)
+
+  if args.command == 'run':
+    unknown = [name for name in args.workloads if name not in WORKLOADS]
+    if unknown:
+      parser.error(f'unknown workloads: {", ".join(unknown)}')
+    def report(name, result):
+      print(f'{name:<14} {result["wall_s"]:9.4f}s {result["statements_per_s"] or 0:>14,.0f} stmts/s '
+            f'{result["peak_bytes"] / 1024:>10.0f}KiB peak', file=sys.stderr, flush=True)
+    results = run_suite(args.workloads or None, args.scale, args.repeat, args.engine, args.cache, report)
+    text = json.dumps(results, indent=2)
+    if args.output:
+      with open(args.output, 'w') as f:
+        f.write(text + '\n')
+    else:
+      print(text)
+    return 0
+
+  with open(args.old) as f:
+    old = json.load(f)
+  with open(args.new) as f:
+    new = json.load(f)
+  regressions = 0
+  for name, metric, before, after, change, regressed in compare(old, new, args.threshold):
+    regressions += regressed
+    print(f'{name:<14} {metric:<17} {_format(metric, before):>14} -> {_format(metric, after):>14} '
+          f'{change:+8.1%}' + ('  REGRESSION' if regressed else ''))
+  return 1 if regressions else 0
+
+if __name__ == '__main__':
+  sys.exit(main())
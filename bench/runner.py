@@ -0,0 +1,101 @@
+# Times workloads through Interpreter.run and compares result files
+import gc
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from interpreterv1 import Interpreter
+from bench.workloads import WORKLOADS
+
+def _run_once(lines, input_lines, engine, cache, max_steps=None):
+  interpreter = Interpreter(console_output=False, input=list(input_lines), engine=engine, cache=cache)
+  interpreter.run(lines, max_steps)
+  return interpreter
+
+def run_workload(name, scale=1.0, repeat=3, engine=Interpreter.REFERENCE_ENGINE, cache=False):
+  generator, size = WORKLOADS[name]
+  size = max(1, int(size * scale))
+  lines, input_lines = generator(size)
+
+  # count statements with a separate run, so the timed runs carry no counting overhead
+  statements = _run_once(lines, input_lines, engine, cache, max_steps=float('inf')).steps
+
+  times = []
+  for _ in range(repeat):
+    gc.collect()
+    start = time.perf_counter()
+    _run_once(lines, input_lines, engine, cache)
+    times.append(time.perf_counter() - start)
+
+  # tracemalloc slows execution down, so memory gets its own run too
+  gc.collect()
+  tracemalloc.start()
+  try:
+    _run_once(lines, input_lines, engine, cache)
+    peak = tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+  best = min(times)
+  return {
+    'size': size,
+    'lines': len(lines),
+    'statements': statements,
+    'wall_s': best,
+    'median_s': statistics.median(times),
+    'statements_per_s': statements / best if best else None,
+    'peak_bytes': peak,
+  }
+
+def _git_revision():
+  try:
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=here, capture_output=True,
+                          text=True, timeout=10).stdout.strip() or None
+  except (OSError, subprocess.SubprocessError):
+    return None
+
+def run_suite(names=None, scale=1.0, repeat=3, engine=Interpreter.REFERENCE_ENGINE, cache=False, report=None):
+  results = {}
+  for name in names or WORKLOADS:
+    results[name] = run_workload(name, scale, repeat, engine, cache)
+    if report:
+      report(name, results[name])
+  return {
+    'meta': {
+      'engine': engine,
+      'cache': cache,
+      'scale': scale,
+      'repeat': repeat,
+      'python': sys.version.split()[0],
+      'platform': platform.platform(),
+      'revision': _git_revision(),
+      'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    },
+    'results': results,
+  }
+
+# metrics compared between runs, and whether bigger is better for each
+METRICS = (('wall_s', False), ('statements_per_s', True), ('peak_bytes', False))
+
+def compare(old, new, threshold=0.10):
+  # returns (workload, metric, old value, new value, relative change, regressed) rows for
+  # workloads present in both result sets; a change counts as a regression once it makes
+  # the metric worse by more than threshold
+  rows = []
+  for name in old['results']:
+    if name not in new['results']:
+      continue
+    for metric, higher_is_better in METRICS:
+      before = old['results'][name].get(metric)
+      after = new['results'][name].get(metric)
+      if not before or after is None:
+        continue
+      change = (after - before) / before
+      worse = -change if higher_is_better else change
+      rows.append((name, metric, before, after, change, worse > threshold))
+  return rows
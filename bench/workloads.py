@@ -0,0 +1,105 @@
+# Generators for parameterized Brewin programs. Each takes a size and returns
+# (program lines, input lines), and is registered in WORKLOADS with a default size
+
+def recursion(depth):
+  # non-tail recursion like the fact example, every level stays on the block stack
+  return ['func main',
+          f' assign n {depth}',
+          ' assign total 0',
+          ' funccall down',
+          ' funccall print total',
+          'endfunc',
+          'func down',
+          ' if > n 0',
+          '  assign total + total n',
+          '  assign n - n 1',
+          '  funccall down',
+          ' endif',
+          'endfunc'], []
+
+def nested_loops(size):
+  return ['func main',
+          ' assign i 0',
+          ' assign sum 0',
+          f' while < i {size}',
+          '  assign j 0',
+          f'  while < j {size}',
+          '   assign sum + sum * i j',
+          '   assign j + j 1',
+          '  endwhile',
+          '  assign i + i 1',
+          ' endwhile',
+          ' funccall print sum',
+          'endfunc'], []
+
+def string_concat(length):
+  return ['func main',
+          ' assign s ""',
+          ' assign i 0',
+          f' while < i {length}',
+          '  assign s + s "ab"',
+          '  assign i + i 1',
+          ' endwhile',
+          ' assign done == s ""',
+          ' funccall print done',
+          'endfunc'], []
+
+def if_chain(width):
+  # a wide if/else ladder run once for every value it can match
+  lines = ['func main',
+           ' assign i 0',
+           f' while < i {width}',
+           '  funccall classify',
+           '  assign i + i 1',
+           ' endwhile',
+           ' funccall print result',
+           'endfunc',
+           'func classify']
+  for k in range(width):
+    indent = ' ' * (k+1)
+    lines.append(f'{indent}if == i {k}')
+    lines.append(f'{indent} assign result {k}')
+    lines.append(f'{indent}else')
+  for k in range(width-1, -1, -1):
+    lines.append(' ' * (k+1) + 'endif')
+  lines.append('endfunc')
+  return lines, []
+
+def large_source(functions):
+  # mostly load time: many helper functions of which only one is called
+  lines = ['func main', ' funccall helper0', ' funccall print result', 'endfunc']
+  for k in range(functions):
+    lines += ['',
+              f'func helper{k}',
+              f' # helper number {k}',
+              f' assign x + {k} 1',
+              ' if == x 0',
+              '  funccall print "zero" x',
+              ' else',
+              '  assign result "nonzero"',
+              ' endif',
+              ' while False',
+              ' endwhile',
+              'endfunc']
+  return lines, []
+
+def input_echo(count):
+  lines = ['func main',
+           ' assign i 0',
+           f' while < i {count}',
+           '  funccall input "> "',
+           '  funccall print result',
+           '  assign i + i 1',
+           ' endwhile',
+           'endfunc']
+  return lines, [str(k) for k in range(count)]
+
+# name -> (generator, default size)
+WORKLOADS = {
+  'recursion': (recursion, 2000),
+  'nested_loops': (nested_loops, 150),
+  'string_concat': (string_concat, 5000),
+  'if_chain': (if_chain, 150),
+  'large_source': (large_source, 10000),
+  'input_echo': (input_echo, 20000),
+}
@@ -0,0 +1,90 @@
+# Load time checks for Brewin programs. Everything about a statement that can be decided from the
+# program text (argument counts, assignment target names, calls to undefined functions and, when the
+# block structure is regular, funccall alignment) is checked once here, so the engines only check what
+# depends on runtime state. Nothing is raised here though: errors on lines that never run must not
+# stop a program, so each error is recorded against its line and raised when that line runs, with
+# the same type, description and line number as the checks in the statement handlers used to give
+from intbase import InterpreterBase, ErrorType
+import lexer
+import re
+
+NAME_REGEX = re.compile("[a-zA-Z][a-zA-z0-9_]*$")
+
+def check(program, lines, enclosing):
+  # checks the given lines, enclosing being enclosing_blocks(program). Returns (errors, dynamic_calls):
+  # errors maps lines to the (error type, description) running them raises, dynamic_calls
+  # holds the funccall lines whose alignment can only be checked against the block stack
+  errors = {}
+  dynamic_calls = set()
+  for i in lines:
+    tokens = program.tokenized_lines[i]
+    if not tokens:
+      continue
+    token = tokens[0]
+    error = None
+    if token == InterpreterBase.FUNCCALL_DEF:
+      error = _check_call(program, i, tokens, enclosing, dynamic_calls)
+    elif token in lexer.CLOSERS:
+      if len(tokens) != 1:
+        error = (ErrorType.SYNTAX_ERROR, f"{token} may not be followed by an expression")
+    elif token in lexer.BUILTINS:
+      error = _check_builtin(token, tokens)
+    elif token == InterpreterBase.IF_DEF or token == InterpreterBase.WHILE_DEF:
+      if len(tokens) < 2:
+        error = (ErrorType.SYNTAX_ERROR, f"{token} must be followed by expression")
+    elif token == InterpreterBase.ASSIGN_DEF:
+      if len(tokens) < 2:
+        error = (ErrorType.SYNTAX_ERROR, f"invalid number of arguments for assign, need 3, got {len(tokens)}")
+      elif NAME_REGEX.match(tokens[1]) is None:
+        error = (ErrorType.SYNTAX_ERROR, "variables names must begin with letters and consist of letters, numbers, and underscores")
+    if error is not None:
+      errors[i] = error
+  return errors, dynamic_calls
+
+def _check_call(program, i, tokens, enclosing, dynamic_calls):
+  if len(tokens) < 2:
+    return (ErrorType.SYNTAX_ERROR, f"invalid number of arguments for funccall, need 2, got {len(tokens)}")
+  # the innermost open block is the one the call is written in, unless the structure is irregular
+  opener = enclosing[i] if enclosing is not None else None
+  if opener is None:
+    dynamic_calls.add(i)
+  elif program.indents[opener] >= program.indents[i]:
+    return (ErrorType.SYNTAX_ERROR, "misaligned funccall statement")
+  func_name = tokens[1]
+  if func_name in lexer.BUILTINS:
+    return _check_builtin(func_name, tokens)
+  if func_name not in program.functions:
+    return (ErrorType.NAME_ERROR, f"function {func_name} is not defined")
+  return None
+
+def _check_builtin(name, tokens):
+  if name == InterpreterBase.STRTOINT_DEF:
+    if len(tokens) != 3:
+      return (ErrorType.SYNTAX_ERROR, f"invalid number of arguments for funccall strtoint, need 3, got {len(tokens)}")
+  elif len(tokens) < 3:
+    return (ErrorType.SYNTAX_ERROR, f"invalid number of arguments for funccall {name}, need at least 3, got {len(tokens)}")
+  return None
+
+def enclosing_blocks(program):
+  # the opening line of the innermost block around each line, which is what tops the block stack
+  # when that line runs. Returns None if blocks at runtime may not follow the validated structure:
+  # block keywords validation doesn't count as such (like "if,x") still open and close blocks at
+  # runtime, and a function nested in another block can be run with the outer function's frame on top.
+  # Only the first token of each line is looked at, so this also works on lazily loaded programs
+  enclosing = [None] * len(program.tokenized_lines)
+  stack = []
+  for i, (line, tokens) in enumerate(zip(program.lines, program.tokenized_lines)):
+    enclosing[i] = stack[-1] if stack else None
+    if not tokens:
+      continue
+    kind = lexer.block_kind(line, tokens)
+    if kind is None:
+      if tokens[0] in lexer.OPENERS or tokens[0] in lexer.CLOSERS:
+        return None
+    elif kind in lexer.OPENERS:
+      if kind == InterpreterBase.FUNC_DEF and stack:
+        return None
+      stack.append(i)
+    elif kind != InterpreterBase.ELSE_DEF and stack:
+      stack.pop()
+  return enclosing
@@ -0,0 +1,161 @@
+# Compiles prefix expressions into closures so each source line is only parsed once.
+# Every compiled closure takes the interpreter as its only argument and
+# produces the same value (and raises the same errors) as Interpreter.process_expression.
+# Variables are resolved to integer slots in the interpreter's values list ahead of time.
+# With optimize on, literal subexpressions are folded at compile time and & or | with one
+# constant operand is reduced to a type check of the other, never changing what is raised
+from intbase import InterpreterBase, ErrorType
+from rope import Rope, concat, flatten
+import operator
+import re
+
+NUMBER_REGEX = re.compile("-[1-9][0-9]*$|[0-9]$|[1-9][0-9]*$")
+STRING_REGEX = re.compile("\".*\"")
+OPERATORS = {"+", "-", "*", "/", "%", "<", ">", "<=", ">=", "!=", "==", "&", "|"}
+
+UNSET = object() # value of a slot whose variable has not been assigned yet
+RESULT_SLOT = 0
+
+# how each operator applies to two operands of the same type, keyed by (operator, type).
+# == and != work on operands of any type, every other missing combination is a type error
+_FUNCS = {'==': operator.eq, '!=': operator.ne, '+': operator.add, '<': operator.lt, '>': operator.gt,
+          '<=': operator.le, '>=': operator.ge, '-': operator.sub, '*': operator.mul,
+          '/': operator.floordiv, '%': operator.mod,
+          '&': lambda a, b: a and b, '|': lambda a, b: a or b}
+OPERATOR_TABLE = {}
+for _type, _ops in ((int, ('==', '!=', '+', '<', '>', '<=', '>=', '-', '*', '/', '%')),
+                    (str, ('==', '!=', '<', '>', '<=', '>=')),
+                    (bool, ('==', '!=', '&', '|'))):
+  for _op in _ops:
+    OPERATOR_TABLE[_op, _type] = _FUNCS[_op]
+ANY_TYPE = {'==': operator.eq, '!=': operator.ne}
+
+# strings may also be ropes (see rope.py), which concatenate cheaply and are flattened to compare.
+# Operands that are one of each are keyed by (operator, type, type)
+MIXED_TABLE = {}
+OPERATOR_TABLE['+', str] = OPERATOR_TABLE['+', Rope] = concat
+MIXED_TABLE['+', Rope, str] = MIXED_TABLE['+', str, Rope] = concat
+for _op in ('==', '!=', '<', '>', '<=', '>='):
+  OPERATOR_TABLE[_op, Rope] = MIXED_TABLE[_op, Rope, str] = MIXED_TABLE[_op, str, Rope] = \
+    lambda a, b, func=_FUNCS[_op]: func(str(a), str(b))
+
+def operator_for(op, type_a, type_b):
+  # the function applying op to operands of these types, or None for a type error
+  if type_a is type_b:
+    return OPERATOR_TABLE.get((op, type_a)) or ANY_TYPE.get(op)
+  return MIXED_TABLE.get((op, type_a, type_b))
+
+def assign_slots(tokenized_lines):
+  # variables only come into existence through assign (or as result), so
+  # every name that can ever hold a value gets a slot here
+  slots = {InterpreterBase.RESULT_DEF: RESULT_SLOT}
+  for tokens in tokenized_lines:
+    if len(tokens) >= 2 and tokens[0] == InterpreterBase.ASSIGN_DEF and tokens[1] not in slots:
+      slots[tokens[1]] = len(slots)
+  return slots
+
+def _constant(value):
+  node = lambda it: value
+  node.constant = value
+  return node
+
+def constant_of(node):
+  # the value of a compiled operand or expression that is known at compile time, otherwise UNSET
+  return getattr(node, 'constant', UNSET)
+
+def compile_operand(v, slots):
+  # literals are parsed once here instead of on every evaluation
+  if NUMBER_REGEX.match(v):
+    return _constant(int(v))
+  # variable names always begin with a letter, so quoted tokens can never be shadowed
+  if STRING_REGEX.match(v):
+    return _constant(v[1:-1])
+
+  slot = slots.get(v)
+  # True and False are only literals if no variable of that name exists
+  if v == InterpreterBase.TRUE_DEF or v == InterpreterBase.FALSE_DEF:
+    literal = v == InterpreterBase.TRUE_DEF
+    if slot is None:
+      return _constant(literal)
+    def overridable(it):
+      value = it.values[slot]
+      return literal if value is UNSET else value
+    return overridable
+
+  def undefined(it):
+    it.error(ErrorType.NAME_ERROR, description=f"variable {v} is not defined", line_num=it.ip_)
+  # names that are never assigned anywhere can never be defined
+  if slot is None:
+    return undefined
+
+  def operand(it):
+    value = it.values[slot]
+    if value is UNSET:
+      undefined(it)
+    return value
+  return operand
+
+def compile_expression(tokens, slots, optimize=True):
+  operators = [token for token in tokens if token in OPERATORS]
+  operands = [compile_operand(token, slots) for token in tokens if token not in OPERATORS]
+
+  # malformed expressions are rare, so let the stack based evaluator
+  # produce its usual mix of name, type and syntax errors
+  if len(operands) != len(operators) + 1:
+    tokens = list(tokens)
+    return lambda it: it.process_expression(tokens)
+
+  # operators apply right to left, each to the next operand and everything after it
+  node = operands[-1]
+  for i in range(len(operators)-1, -1, -1):
+    node = _optimize_binary(operators[i], operands[i], node) if optimize else _compile_binary(operators[i], operands[i], node)
+  return node
+
+def _optimize_binary(op, left, right):
+  a = constant_of(left)
+  b = constant_of(right)
+  if a is not UNSET and b is not UNSET:
+    if type(a) is type(b) and (op, type(a)) in OPERATOR_TABLE and not (op in ('/', '%') and b == 0):
+      return _constant(flatten(OPERATOR_TABLE[op, type(a)](a, b)))
+    return _compile_binary(op, left, right)
+
+  # & and | with a boolean constant either give the other operand or the constant, once
+  # compute has checked the other operand is a boolean too (raising its usual error if not)
+  if op not in ('&', '|') or (type(a) is not bool and type(b) is not bool):
+    return _compile_binary(op, left, right)
+  absorbs = (op == '|') == (a if type(a) is bool else b) # & False and | True ignore the other operand
+  if type(a) is bool:
+    def constant_left(it):
+      value = right(it)
+      if type(value) is not bool:
+        it.compute(op, a, value)
+      return a if absorbs else value
+    return constant_left
+  def constant_right(it):
+    value = left(it)
+    if type(value) is not bool:
+      it.compute(op, value, b)
+    return b if absorbs else value
+  return constant_right
+
+def _compile_binary(op, left, right):
+  # each site remembers the operand types it saw last and the function for them, so
+  # while the types stay the same evaluation is two type checks and a call
+  cached_a = None
+  cached_b = None
+  cached_func = None
+  def binary(it):
+    nonlocal cached_a, cached_b, cached_func
+    a = left(it)
+    b = right(it)
+    if type(a) is cached_a and type(b) is cached_b:
+      return cached_func(a, b)
+    func = operator_for(op, type(a), type(b))
+    if func is None:
+      # compute raises the right type error
+      return it.compute(op, a, b)
+    cached_a = type(a)
+    cached_b = type(b)
+    cached_func = func
+    return func(a, b)
+  return binary
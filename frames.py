@@ -0,0 +1,33 @@
+# Entries of an interpreter's block stack, one per open if, while or function call.
+# They use __slots__ rather than nested lists, so each entry is a single small object,
+# which keeps deep recursion cheap. kind is the keyword that opened the block
+from intbase import InterpreterBase
+
+class IfBlock:
+  __slots__ = ('indent', 'taken')
+  kind = InterpreterBase.IF_DEF
+
+  def __init__(self, indent, taken):
+    self.indent = indent
+    self.taken = taken # whether the if branch ran, so a following else is skipped
+
+class WhileBlock:
+  __slots__ = ('indent', 'while_ip', 'after_ip')
+  kind = InterpreterBase.WHILE_DEF
+
+  def __init__(self, indent, while_ip, after_ip):
+    self.indent = indent
+    self.while_ip = while_ip # line of the while, where endwhile jumps back to
+    self.after_ip = after_ip # where to continue once the condition is false
+
+class CallFrame:
+  __slots__ = ('indent', 'name', 'after_ip', 'main')
+  kind = InterpreterBase.FUNCCALL_DEF
+
+  def __init__(self, indent, name, after_ip, main):
+    self.indent = indent # indent of the function being run
+    self.name = name
+    self.after_ip = after_ip # where to continue when the function returns, None for main
+    # returning ends the program, because this function is main or was
+    # tail called (possibly via other functions) from the end of main
+    self.main = main
@@ -7,6 +7,14 @@ class ErrorType(Enum):
   SYNTAX_ERROR = 3  # used for syntax errors
   # Add others here
   
+# raised when a run is cut off by its step limit, this is not an error in the program itself
+class StepLimitExceeded(Exception):
+  pass
+
+# raised when a program recurses deeper than the python engine can go (see transpiler.py),
+# this is not an error in the program either, which runs on the other engines
+class RecursionLimitExceeded(Exception):
+  pass
 
 class InterpreterBase:
 
@@ -44,15 +52,25 @@ class InterpreterBase:
   ENDLAMBDA_DEF = 'endlambda'
 
   # methods
-  def __init__(self, console_output=True, input=None):
+  def __init__(self, console_output=True, input=None, output_sink=None, input_source=None):
     self.console_output = console_output 
     self.input = input  # if not none, then read input from passed-in list
+    self.input_source = input_source  # if not none, read input from this source instead (see sources.py)
+    if input_source is not None:
+      self.get_input = input_source.read
+    self.output_sink = output_sink  # if not none, output goes to this sink instead of output_log (see sinks.py)
+    if output_sink is not None:
+      self.output = output_sink.write
     self.reset()
 
   # Call to reset I/O for another run of the program
   def reset(self):
     self.output_log = []
+    if self.output_sink is not None:
+      self.output_sink.reset()
     self.input_cursor = 0
+    if self.input_source is not None:
+      self.input_source.reset()
     self.error_type = None
     self.error_line = None
 
@@ -62,6 +80,7 @@ class InterpreterBase:
 
   def get_input(self):
     if not self.input:
+      self.flush_output()  # so prompts are visible before we block
       return input()  # Get input from keyboard if not input list provided
 
     if self.input_cursor < len(self.input):
@@ -92,8 +111,15 @@ class InterpreterBase:
     self.output_log.append(v)
 
   def get_output(self):
+    if self.output_sink is not None:
+      return self.output_sink.lines()
     return self.output_log
 
+  # called at the end of every run so buffered output is written out
+  def flush_output(self):
+    if self.output_sink is not None:
+      self.output_sink.flush()
+
   def get_error_type_and_line(self):
     return self.error_type, self.error_line
 
@@ -1,88 +1,168 @@
-from intbase import InterpreterBase, ErrorType
+from intbase import InterpreterBase, ErrorType, StepLimitExceeded
+from expression import compile_operand, compile_expression, operator_for, UNSET, RESULT_SLOT
+from program import Program
+from frames import IfBlock, WhileBlock, CallFrame
+from rope import Rope, flatten
+import profiler
+import transpiler
+import vm
 import re
 
 class Interpreter(InterpreterBase):
-  NAME_REGEX = "[a-zA-Z][a-zA-z0-9_]*$"
   NUMBER_REGEX = "-[1-9][0-9]*$|[0-9]$|[1-9][0-9]*$"
   OPERATORS = {"+", "-", "*", "/", "%", "<", ">", "<=", ">=", "!=", "==", "&", "|"}
-  TYPE_IDX = 0
-  INDENT_IDX = 1
-  INFO_IDX = 2
-  WHILE_IP = 0
-  AFTER_ENDWHILE_IP = 1
-  FUNCTION_NAME = 0
-  AFTER_FUNCCALL_IP = 1
-  def __init__(self, console_output=True, input=None, trace_output=False):
-    super().__init__(console_output, input)
-    self.variables = {}
+  REFERENCE_ENGINE = 'reference' # executes tokenized lines directly
+  VM_ENGINE = 'vm' # compiles to bytecode first, see vm.py
+  PYTHON_ENGINE = 'python' # translates to python code first where it can, see transpiler.py
+  def __init__(self, console_output=True, input=None, trace_output=False, engine=REFERENCE_ENGINE, cache=False, output_sink=None, input_source=None, optimize=True, lazy=False, incremental=False, compact=False):
+    super().__init__(console_output, input, output_sink, input_source)
+    if engine not in (self.REFERENCE_ENGINE, self.VM_ENGINE, self.PYTHON_ENGINE):
+      raise ValueError(f"unknown engine {engine}")
+    self.engine = engine
+    self.trace_output = trace_output # True to profile runs, or a path to also write the profile to as JSON
+    self.profile = None # profiler.Profile of the last traced run
+    self.cache = cache # reuse (and store) prepared programs in the on-disk cache, see progcache.py
+    self.optimize = optimize # fold constants in programs this interpreter loads, see expression.py
+    self.lazy = lazy # only tokenize functions of programs this interpreter loads as they first run, see Program.load
+    self.compact = compact # store programs this interpreter loads in flat buffers, see Program.load
+    self.incremental = incremental # prepare source lines as an edit of the last program run, see Program.update
+    self.program = None # the Program last started
+    self.slots = {} # maps each variable name to its index in values
+    self.values = [] # current value of every variable, UNSET until assigned
     self.functions = {}
+    self.main_lines = [] # lines defining main, normally just one
     self.operand_stk = []
     self.operator_stk = []
     self.indents = [] # stores indents for each line
     self.tokenized_lines = [] # stores tokenized version of each line
-    self.block_stk = [] # 4 fields: type (funccall, if, while), ip, indent, specific info based on type
+    self.expressions = {} # compiled expression (or print/input arguments) for each line, built on first run
+    self.block_stk = [] # an IfBlock, WhileBlock or CallFrame for each open block, see frames.py
+    self.jumps = {} # maps each block opener (and else) to the line of its partner
+    self.tail_calls = {} # maps each funccall that ends a function to that function's endfunc
+    self.static_errors = {} # maps lines to the error running them raises, see checker.py
+    self.dynamic_calls = set() # funccall lines whose alignment is checked at runtime
     self.terminated = False
     self.ip_ = 0
+    self.steps = 0 # statements executed by the last run with a step limit or trace_output, or by step
     
-  def run(self, program):
-    super().validate_program(program)
-    # TODO: check when no main exists
-    self.program = program
-    
-    # tokenize everything and calculate indentations at beginning
-    for line in self.program:
-      self.indents.append(self.calculate_indent(line))
-      self.tokenized_lines.append(self.tokenize(line))
-      
-    # find all function definitions and move ip to main function 
-    self.find_funcs_and_main()
+  # program is either a list of source lines or a Program loaded earlier,
+  # which lets many interpreters share one parsed program. With max_steps, the run
+  # raises StepLimitExceeded once that many statements have executed
+  def run(self, program, max_steps=None):
+    try:
+      self.start(program)
+      self.__execute(max_steps, True)
+    finally:
+      self.flush_output()
+
+  # runs a program set up by start (perhaps partly run with step, or restored from a snapshot,
+  # see snapshot.py) to completion. max_steps limits the statements run in total, as with run
+  def resume(self, max_steps=None):
+    try:
+      self.__execute(max_steps, False)
+    finally:
+      self.flush_output()
+
+  def __execute(self, max_steps, from_start):
+    # profiling gets its own loop so untraced runs pay nothing for it
+    if self.trace_output:
+      self.profile = profiler.Profile(self.program)
+      step = self.__interpret
+      if self.engine == self.VM_ENGINE:
+        # so the profile counts the same lines as on the reference engine
+        self.code = self.program.bytecode(True)
+        step = lambda: vm.step(self)
+      try:
+        self.profile.run(self, step, max_steps)
+      finally:
+        self.profile.emit(self.trace_output)
+      return
     
-    while (not self.terminated):
-      self.__interpret()
-  
-  def find_funcs_and_main(self):
-    for i in range(len(self.tokenized_lines)):
-      tokens = self.tokenized_lines[i]
-      if (len(tokens) < 2):
-        continue
-      if tokens[0] == self.FUNC_DEF:
-        self.initialize_func(tokens, i)
-      
-  def initialize_func(self, tokens, i):
-    if (len(tokens) < 2):
-      self.error(ErrorType.SYNTAX_ERROR, description=f"invalid number of arguments for func, need 2, got {len(tokens)}", line_num=i)
-    func_name = tokens[1]
-    self.functions[func_name] = i
-    # main function is an exception in that func instead of funccall representing invocation
-    if func_name == "main":
-      self.ip_ = i+1
-      self.block_stk.append([self.FUNCCALL_DEF, self.indents[i], [func_name, None]])
+    if self.engine == self.VM_ENGINE:
+      vm.execute(self, max_steps)
       return
 
-  def calculate_indent(self, line):
-    indent = 0
-    while (indent < len(line) and line[indent] == ' '):
-      indent+=1
-    return indent
-  
-  def tokenize(self, line):
-    # regex found at https://stackoverflow.com/questions/16710076/python-split-a-string-respect-and-preserve-quotes
-    tokens_with_comments = re.findall(r'(?:[^\s,"]|"(?:\\.|[^"])*")+', line)
-    tokens = []
-    # iterate through tokens and break at first '#' not in a comment, thus ignoring all subsequent tokens (comments)
-    for token in tokens_with_comments:
-      commentBegin = token.find("#")
-      if commentBegin == 0:
-        break
-      # 2 quotes before comment indicates string, 0 quotes before comment
-      # indicates other token, we need to keep token in both cases
-      elif commentBegin > 0 and token[:commentBegin].count('\"') % 2 == 0:
-        tokens.append(token[:commentBegin])
-        break
+    # translated code can't count statements or start midway, so limited or resumed
+    # runs (and programs it doesn't cover) are interpreted
+    if self.engine == self.PYTHON_ENGINE and max_steps is None and from_start:
+      translation = self.program.translation()
+      if translation.code is not None:
+        transpiler.run(self, translation)
+        return
+
+    if max_steps is None:
+      while (not self.terminated):
+        self.__interpret()
+      return
+
+    while self.steps < max_steps:
+      if self.terminated:
+        return
+      self.__interpret()
+      self.steps += 1
+    if not self.terminated:
+      raise StepLimitExceeded(f"program did not finish within {max_steps} steps")
+
+  # sets up a run of program (source lines or a Program) without executing any of it,
+  # as run does before running to completion, or for running piecemeal with step
+  def start(self, program):
+    if not isinstance(program, Program):
+      if self.incremental and self.program is not None and self.program.optimize == self.optimize and self.program.compact == self.compact:
+        program = self.program.update(program, self, self.cache)
       else:
-        tokens.append(token)
-    return tokens
-    
+        program = Program.load(program, self, self.cache, self.optimize, self.lazy, self.compact)
+    # TODO: check when no main exists
+    # program data is shared, only the state below belongs to this run
+    self.program = program
+    self.indents = program.indents
+    self.tokenized_lines = program.tokenized_lines
+    self.jumps = program.jumps
+    self.functions = program.functions
+    self.main_lines = program.main_lines
+    self.slots = program.slots
+    self.tail_calls = program.tail_calls
+    self.static_errors = program.static_errors
+    self.dynamic_calls = program.dynamic_calls
+    self.expressions = program.expressions
+    if self.engine == self.VM_ENGINE:
+      self.code = program.bytecode()
+
+    self.values = [UNSET] * len(self.slots)
+    self.operand_stk = []
+    self.operator_stk = []
+    self.block_stk = []
+    self.terminated = False
+    self.ip_ = 0
+    self.steps = 0
+    # move ip to main function
+    for i in self.main_lines:
+      self.enter_main(i)
+
+  # executes at most n more statements of the program set up by start, stopping early once it
+  # terminates or (after at least one statement) on reaching a line in stop_before. Returns
+  # whether the program has terminated. This lets callers pause and resume programs, see scheduler.py
+  def step(self, n=1, stop_before=()):
+    if self.engine == self.VM_ENGINE:
+      return vm.execute_slice(self, n, stop_before)
+    interpret = self.__interpret
+    done = 0
+    try:
+      while done < n and not self.terminated:
+        if done and self.ip_ in stop_before:
+          break
+        interpret()
+        done += 1
+    finally:
+      self.steps += done
+    return self.terminated
+
+  def enter_main(self, i):
+    # main function is an exception in that func instead of funccall representing invocation
+    if self.program.pending:
+      self.program.load_function(i)
+    self.ip_ = i+1
+    self.block_stk.append(CallFrame(self.indents[i], "main", None, True))
+
   def __interpret(self):
     # parse current line into tokens
     tokens = self.tokenized_lines[self.ip_]
@@ -91,6 +171,10 @@ class Interpreter(InterpreterBase):
     if (len(tokens) == 0):
       self.ip_ += 1
       return
+
+    # anything wrong with the line itself was found when the program was loaded
+    if self.ip_ in self.static_errors:
+      self.raise_static_error()
     
     token = tokens[0]
     if (token == self.FUNC_DEF):
@@ -125,13 +209,22 @@ class Interpreter(InterpreterBase):
     # should just move ip to first actual line of function
     self.ip_+=1
       
-  def process_funccall(self, tokens):
-    if (len(tokens) < 2):
-      self.error(ErrorType.SYNTAX_ERROR, description=f"invalid number of arguments for funccall, need 2, got {len(tokens)}", line_num=self.ip_)
-      
+  def raise_static_error(self):
+    # a call's alignment is checked before anything else about it
+    if self.ip_ in self.dynamic_calls:
+      self.check_alignment()
+    error_type, description = self.static_errors[self.ip_]
+    self.error(error_type, description=description, line_num=self.ip_)
+
+  def check_alignment(self):
     # check that indent is greater than outer block
-    if not self.block_stk or self.block_stk[-1][self.INDENT_IDX] >= self.indents[self.ip_]:
+    if not self.block_stk or self.block_stk[-1].indent >= self.indents[self.ip_]:
       self.error(ErrorType.SYNTAX_ERROR, description="misaligned funccall statement", line_num=self.ip_)
+
+  def process_funccall(self, tokens):
+    # alignment is usually known from the block structure, see checker.py
+    if self.ip_ in self.dynamic_calls:
+      self.check_alignment()
     
     func_name = tokens[1]
     # handle calling prefined functions
@@ -145,15 +238,23 @@ class Interpreter(InterpreterBase):
         self.process_print(tokens)
         return
         
-    # validate func_name if it did not match predefined functions
-    if func_name not in self.functions:
-      self.error(ErrorType.NAME_ERROR, description=f"function {func_name} is not defined", line_num=self.ip_)
-    
     loc = self.functions[func_name]
+    if self.program.pending:
+      self.program.load_function(loc)
+
+    # a tail call takes over the caller's frame, returning straight to where the caller would have,
+    # as long as the caller's endfunc would have found that frame on top
+    end = self.tail_calls.get(self.ip_)
+    if end is not None:
+      top = self.block_stk[-1]
+      if top.kind == self.FUNCCALL_DEF and top.indent == self.indents[end]:
+        self.block_stk[-1] = CallFrame(self.indents[loc], func_name, top.after_ip, top.main or func_name == "main")
+        self.ip_ = loc
+        return
     
     # push funccall statement to block_stk since new block has been created
     # (did not need this for predefined functions since we can guarantee no further block nesting)
-    self.block_stk.append([self.FUNCCALL_DEF, self.indents[loc], [func_name, self.ip_+1]])
+    self.block_stk.append(CallFrame(self.indents[loc], func_name, self.ip_+1, func_name == "main"))
         
     #  move ip to function definition 
     self.ip_ = loc
@@ -161,165 +262,125 @@ class Interpreter(InterpreterBase):
   def process_return(self, tokens):
     # hitting return still moves ip to endfunc for generalized approach with an without return statement
     if (len(tokens) >= 2):
-      expr_res = self.process_expression(tokens[1:])
-      self.variables["result"] = expr_res
+      expr_res = self.evaluate_expression(tokens, 1)
+      self.values[RESULT_SLOT] = expr_res
       
     # pop from block_stk until reaching innermost funccall (since return could be inside another block)
-    while self.block_stk and self.block_stk[-1][self.TYPE_IDX] != self.FUNCCALL_DEF:
+    while self.block_stk and self.block_stk[-1].kind != self.FUNCCALL_DEF:
       self.block_stk.pop()
       
-    # find endfunc for current function (since we want to exit this function)
-    for i in range(self.ip_+1, len(self.program)):
-      if self.indents[i] == self.block_stk[-1][self.INDENT_IDX] and len(self.tokenized_lines[i]) >= 1 and self.tokenized_lines[i][0] == self.ENDFUNC_DEF:
-        self.ip_ = i
-        break
+    # jump to endfunc for current function (since we want to exit this function)
+    func_name = self.block_stk[-1].name
+    self.ip_ = self.jumps[self.functions[func_name]]
   
   def process_endfunc(self, tokens):
-    if (len(tokens) != 1):
-      self.error(ErrorType.SYNTAX_ERROR, description=f"endfunc may not be followed by an expression", line_num=self.ip_)
-      
     # check that innermost open block is a funccall with same indent
-    if not self.block_stk or self.block_stk[-1][self.TYPE_IDX] != self.FUNCCALL_DEF or self.block_stk[-1][self.INDENT_IDX] != self.indents[self.ip_]:
+    if not self.block_stk or self.block_stk[-1].kind != self.FUNCCALL_DEF or self.block_stk[-1].indent != self.indents[self.ip_]:
       self.error(ErrorType.SYNTAX_ERROR, description="mismatched endfunc statement")
     
     # terminate program if reaching end of execution for main
-    if self.block_stk[-1][self.INFO_IDX][self.FUNCTION_NAME] == "main":
+    if self.block_stk[-1].main:
       self.terminated = True
       
-    next_ip = self.block_stk[-1][self.INFO_IDX][self.AFTER_FUNCCALL_IP] # save next location of ip before popping
+    next_ip = self.block_stk[-1].after_ip # save next location of ip before popping
     self.block_stk.pop() # pop current block
     self.ip_ = next_ip
     
   def process_strtoint(self, tokens):
-    # check if 3 arguments
-    if (len(tokens) != 3):
-      self.error(ErrorType.SYNTAX_ERROR, description=f"invalid number of arguments for funccall strtoint, need 3, got {len(tokens)}", line_num=self.ip_)
-      
     # num_str is string to convert
     num_str = tokens[2]
     if isinstance(num_str, str):
       # check if value referenced by variable is string
-      if (num_str in self.variables):
-        if isinstance(self.variables[num_str], str) and re.match(self.NUMBER_REGEX, self.variables[num_str]):
-          self.variables["result"] = int(self.variables[num_str])
+      value = flatten(self.lookup(num_str))
+      if (value is not UNSET):
+        if isinstance(value, str) and re.match(self.NUMBER_REGEX, value):
+          self.values[RESULT_SLOT] = int(value)
           self.ip_+=1
           return
         else:
-          self.error(ErrorType.TYPE_ERROR, description=f"variable {num_str} references value {self.variables[num_str]} which does not convert to a valid integer", line_num=self.ip_)
+          self.error(ErrorType.TYPE_ERROR, description=f"variable {num_str} references value {value} which does not convert to a valid integer", line_num=self.ip_)
       # check if formatted as valid number
       elif re.match(self.NUMBER_REGEX, num_str):
-        self.variables["result"] = int(num_str)
+        self.values[RESULT_SLOT] = int(num_str)
       else:
         self.error(ErrorType.TYPE_ERROR, description=f"string to convert must be valid variable or represent valid integer", line_num=self.ip_)
     self.ip_+=1
   
   def process_input(self, tokens):
-    # check if >= 3 arguments
-    if (len(tokens) < 3):
-      self.error(ErrorType.SYNTAX_ERROR, description=f"invalid number of arguments for funccall input, need at least 3, got {len(tokens)}", line_num=self.ip_)
-    prompt_str = ""
-    
     # concat all arguments
-    for token in tokens[2:]:
-      prompt_str += str(self.process_variable(token))
+    prompt_str = "".join([str(operand(self)) for operand in self.compiled_arguments(tokens)])
         
     self.output(prompt_str)
-    self.variables["result"] = self.get_input()   
+    self.values[RESULT_SLOT] = self.get_input()   
     self.ip_+=1
     
   def process_print(self, tokens):
-    if (len(tokens) < 3):
-      self.error(ErrorType.SYNTAX_ERROR, description=f"invalid number of arguments for funccall print, need at least 3, got {len(tokens)}", line_num=self.ip_)
-    
-    res_str = ""
     # concat all arguments
-    for token in tokens[2:]:
-      res_str += str(self.process_variable(token))
+    res_str = "".join([str(operand(self)) for operand in self.compiled_arguments(tokens)])
         
     self.output(res_str)
     self.ip_+=1
   
   def process_if(self, tokens):
-    # check for expression after if
-    if (len(tokens) < 2):
-      self.error(ErrorType.SYNTAX_ERROR, description="if must be followed by expression", line_num=self.ip_)
-      
     # check that indent is greater than outer block
     #if not self.block_stk or self.block_stk[-1][self.INDENT_IDX] >= self.indents[self.ip_]:
       #self.error(ErrorType.SYNTAX_ERROR, description="misaligned if statement")
     
     # process if expression
-    expr_res = self.process_expression(tokens[1:])
+    expr_res = self.evaluate_expression(tokens, 1)
     if (expr_res == True):
       # push if statement to indentations_stk since new block has been created
-      self.block_stk.append([self.IF_DEF, self.indents[self.ip_], True])
+      self.block_stk.append(IfBlock(self.indents[self.ip_], True))
       self.ip_+=1
     elif (expr_res == False):
       # push if statement to indentations_stk since new block has been created
-      self.block_stk.append([self.IF_DEF, self.indents[self.ip_], False])
-      # jump to next else or endif with same indentation
-      for i in range(self.ip_+1, len(self.program)):
-        if self.indents[i] == self.indents[self.ip_] and len(self.tokenized_lines[i]) >= 1 and (self.tokenized_lines[i][0] == self.ELSE_DEF or self.tokenized_lines[i][0] == self.ENDIF_DEF):
-          self.ip_ = i
-          return
+      self.block_stk.append(IfBlock(self.indents[self.ip_], False))
+      # jump to matching else or endif
+      self.ip_ = self.jumps[self.ip_]
     else:
       self.error(ErrorType.TYPE_ERROR, description=f"expression following if statement must evaluate to boolean", line_num=self.ip_)
       
   def process_else(self, tokens):  
-    if (len(tokens) != 1):
-      self.error(ErrorType.SYNTAX_ERROR, description=f"else may not be followed by an expression", line_num=self.ip_)
-      
     if not self.block_stk:
       self.error(ErrorType.SYNTAX_ERROR, description="mismatched else statement", line_num=self.ip_)
       
-    # already took if branch above
-    if self.block_stk[-1][self.INFO_IDX]:
-      # jump to next endif with same indentation
-      for i in range(self.ip_+1, len(self.program)):
-        if self.indents[i] == self.indents[self.ip_] and len(self.tokenized_lines[i]) >= 1 and self.tokenized_lines[i][0] == self.ENDIF_DEF:
-          self.ip_ = i
-          return
+    # already took if branch above (or not in an if at all)
+    top = self.block_stk[-1]
+    if top.kind != self.IF_DEF or top.taken:
+      # jump to matching endif
+      self.ip_ = self.jumps[self.ip_]
     else:
       self.ip_+=1
       
   def process_endif(self, tokens):
-    if (len(tokens) != 1):
-      self.error(ErrorType.SYNTAX_ERROR, description=f"endif may not be followed by an expression", line_num=self.ip_)
-    
     # check that innermost open block is an if with same indent
-    if not self.block_stk or self.block_stk[-1][self.TYPE_IDX] != self.IF_DEF or self.block_stk[-1][self.INDENT_IDX] != self.indents[self.ip_]:
+    if not self.block_stk or self.block_stk[-1].kind != self.IF_DEF or self.block_stk[-1].indent != self.indents[self.ip_]:
       self.error(ErrorType.SYNTAX_ERROR, description="mismatched endif statement", line_num=self.ip_)
       
     self.block_stk.pop() # pop current block
     self.ip_+=1
        
   def process_while(self, tokens):
-    # check for expression after while
-    if (len(tokens) < 2):
-      self.error(ErrorType.SYNTAX_ERROR, description="while must be followed by expression", line_num=self.ip_)
-      
     # check that indent is greater than outer block
     #if not self.block_stk or (self.block_stk[-1][self.INFO_IDX][-1][self.INDENT_IDX] >= self.indents[self.ip_]) :
       #self.error(ErrorType.SYNTAX_ERROR, description="misaligned while statement")
     
-    # when first encountering while, find corresponding endwhile and insert into block_stk
-    if not self.block_stk or self.block_stk[-1][self.TYPE_IDX] != self.WHILE_DEF or self.block_stk[-1][self.INFO_IDX][self.WHILE_IP] != self.ip_:
-      for i in range(self.ip_+1, len(self.program)):
-        if self.indents[i] == self.indents[self.ip_] and len(self.tokenized_lines[i]) >= 1 and self.tokenized_lines[i][0] == self.ENDWHILE_DEF:
-          # push while statement to indentations_stk since new block has been created, store both ip to 
-          # while and ip to line after endwhile (since it is easier to directly jump there after the 
-          # while expression returns false)
-          self.block_stk.append([self.WHILE_DEF, self.indents[self.ip_], [self.ip_, i+1]])
+    # when first encountering while, look up corresponding endwhile and insert into block_stk
+    if not self.block_stk or self.block_stk[-1].kind != self.WHILE_DEF or self.block_stk[-1].while_ip != self.ip_:
+      # push while statement to indentations_stk since new block has been created, store both ip to 
+      # while and ip to line after endwhile (since it is easier to directly jump there after the 
+      # while expression returns false)
+      self.block_stk.append(WhileBlock(self.indents[self.ip_], self.ip_, self.jumps[self.ip_]+1))
         
     # process expression for while statement
-    expr_res = self.process_expression(tokens[1:])
+    expr_res = self.evaluate_expression(tokens, 1)
     if (expr_res == True):
       # enter into while loop if expression returns true
       self.ip_+=1
     elif (expr_res == False):
       # finished with while loop
       # jump to ip after endwhile if expression returns false
-      self.ip_ = self.block_stk[-1][self.INFO_IDX][self.AFTER_ENDWHILE_IP]
+      self.ip_ = self.block_stk[-1].after_ip
       # pop current block
       self.block_stk.pop()
     else:
@@ -327,36 +388,29 @@ class Interpreter(InterpreterBase):
       
   def process_endwhile(self, tokens):
     #self.error(ErrorType.SYNTAX_ERROR, description=f"I will get TikTok job if I fix this")
-    if (len (tokens) != 1):
-      self.error(ErrorType.SYNTAX_ERROR, description=f"endwhile may not be followed by an expression", line_num=self.ip_)
-    
     # check that innermost open block is a while with same indent
-    if not self.block_stk or self.block_stk[-1][self.TYPE_IDX] != self.WHILE_DEF or self.block_stk[-1][self.INDENT_IDX] != self.indents[self.ip_]:
+    if not self.block_stk or self.block_stk[-1].kind != self.WHILE_DEF or self.block_stk[-1].indent != self.indents[self.ip_]:
       self.error(ErrorType.SYNTAX_ERROR, description="mismatched endwhile statement", line_num=self.ip_)
     
     # move ip back to while condition
-    self.ip_ = self.block_stk[-1][self.INFO_IDX][self.WHILE_IP]
+    self.ip_ = self.block_stk[-1].while_ip
       
   def process_assign(self, tokens):
-    if (len(tokens) < 2):
-      self.error(ErrorType.SYNTAX_ERROR, description=f"invalid number of arguments for assign, need 3, got {len(tokens)}", line_num=self.ip_)
     var_name = tokens[1]
-    if (re.match(self.NAME_REGEX, var_name)) is None:
-      self.error(ErrorType.SYNTAX_ERROR, description="variables names must begin with letters and consist of letters, numbers, and underscores", line_num=self.ip_)
     if (len(tokens) == 3):
-      var_val = self.process_variable(tokens[2])
+      var_val = self.evaluate_variable(tokens[2])
     else:
-      var_val = self.process_expression(tokens[2:])
+      var_val = self.evaluate_expression(tokens, 2)
     
-    self.variables[var_name] = var_val
+    self.values[self.slots[var_name]] = var_val
     self.ip_+=1
     
   def process_variable(self, v):
     if (re.match(self.NUMBER_REGEX, v)):
       return int(v)
-    # match variable in dictionary
-    elif (v in self.variables):
-      return self.variables[v]
+    # match variable in its slot
+    elif (self.lookup(v) is not UNSET):
+      return self.lookup(v)
     # strip quotes
     elif (re.match("\".*\"", v)):
       return v[1:-1]
@@ -368,6 +422,36 @@ class Interpreter(InterpreterBase):
     else:
       self.error(ErrorType.NAME_ERROR, description=f"variable {v} is not defined", line_num=self.ip_)
     
+  # the evaluate_* and compiled_* helpers compile the current line's operands the first
+  # time it runs and cache the result, so later runs skip regex matching and the stacks
+  def evaluate_variable(self, v):
+    operand = self.expressions.get(self.ip_)
+    if operand is None:
+      operand = self.expressions[self.ip_] = compile_operand(v, self.slots)
+    return operand(self)
+
+  def evaluate_expression(self, tokens, start):
+    expr = self.expressions.get(self.ip_)
+    if expr is None:
+      expr = self.expressions[self.ip_] = compile_expression(tokens[start:], self.slots, self.program.optimize)
+    return expr(self)
+
+  def compiled_arguments(self, tokens):
+    operands = self.expressions.get(self.ip_)
+    if operands is None:
+      operands = self.expressions[self.ip_] = [compile_operand(token, self.slots) for token in tokens[2:]]
+    return operands
+
+  # returns the value of variable v, or UNSET if it has not been assigned
+  def lookup(self, v):
+    slot = self.slots.get(v)
+    return self.values[slot] if slot is not None else UNSET
+
+  # name -> value view of all assigned variables
+  @property
+  def variables(self):
+    return {name: flatten(self.values[slot]) for name, slot in self.slots.items() if self.values[slot] is not UNSET}
+
   def process_expression(self, tokens):
     for token in tokens:
       if token in self.OPERATORS:
@@ -391,48 +475,21 @@ class Interpreter(InterpreterBase):
     return self.operand_stk.pop()
     
   def compute(self, op, a, b):
+    # ropes are just strings as far as programs can tell
+    if type(a) is Rope:
+      a = str(a)
+    if type(b) is Rope:
+      b = str(b)
+
     # check type mismatch
     if type(a) is not type(b):
       self.error(ErrorType.TYPE_ERROR, description=f"mismatched types '{type(a)}' and '{type(b)}'", line_num=self.ip_)
-      
-    # operators that apply for all types
-    if op == '==':
-      return a == b
-    elif op == '!=':
-      return a != b
-    
-    # operators that apply for int and str
-    if isinstance(a, int) and not isinstance(a, bool) or isinstance(a, str):
-      if op == '+':
-        return a+b
-      elif op == '<':
-        return a < b
-      elif op == '>':
-        return a > b
-      elif op == '<=':
-        return a <= b
-      elif op == '>=':
-        return a >= b
-      
-    # operators that apply for int
-    if isinstance(a, int) and not isinstance(a, bool):
-      if op == '-':
-        return a-b
-      elif op == '*':
-        return a*b
-      elif op == '/':
-        return a//b
-      elif op == '%':
-        return a % b
-      
-    # operators that apply for bool
-    if isinstance(a, bool):
-      if op == '&':
-        return a and b
-      elif op == '|':
-        return a or b
-  
-    return self.error(ErrorType.TYPE_ERROR, description=f"operands of type '{type(a)}' incompatible with operator '{op}'", line_num=self.ip_)
+
+    # look up what op does for this type, see expression.OPERATOR_TABLE
+    func = operator_for(op, type(a), type(b))
+    if func is None:
+      return self.error(ErrorType.TYPE_ERROR, description=f"operands of type '{type(a)}' incompatible with operator '{op}'", line_num=self.ip_)
+    return func(a, b)
       
       
       
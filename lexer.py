@@ -0,0 +1,128 @@
+# Single pass lexer for Brewin programs: computes the indentation and tokens of every line
+# while validating block structure and indentation, instead of separate passes for validation
+# (InterpreterBase.validate_program), indentation and tokenizing. Reports the same errors on the
+# same lines as validate_program
+from array import array
+from intbase import InterpreterBase, ErrorType
+import itertools
+import re
+import store
+
+# regex found at https://stackoverflow.com/questions/16710076/python-split-a-string-respect-and-preserve-quotes
+TOKEN_REGEX = re.compile(r'(?:[^\s,"]|"(?:\\.|[^"])*")+')
+OPENERS = {InterpreterBase.FUNC_DEF: InterpreterBase.ENDFUNC_DEF,
+           InterpreterBase.IF_DEF: InterpreterBase.ENDIF_DEF,
+           InterpreterBase.WHILE_DEF: InterpreterBase.ENDWHILE_DEF}
+CLOSERS = {InterpreterBase.ENDFUNC_DEF, InterpreterBase.ENDIF_DEF, InterpreterBase.ELSE_DEF, InterpreterBase.ENDWHILE_DEF}
+# functions every program can call without defining, and run as statements of their own
+BUILTINS = (InterpreterBase.STRTOINT_DEF, InterpreterBase.INPUT_DEF, InterpreterBase.PRINT_DEF)
+
+def tokenize(line, limit=None):
+  # limit stops after that many tokens, for scans that only look at the start of lines
+  tokens = []
+  found = TOKEN_REGEX.findall(line) if limit is None else [m.group() for m in itertools.islice(TOKEN_REGEX.finditer(line), limit)]
+  # iterate through tokens and break at first '#' not in a comment, thus ignoring all subsequent tokens (comments)
+  for token in found:
+    commentBegin = token.find("#")
+    if commentBegin == 0:
+      break
+    # 2 quotes before comment indicates string, 0 quotes before comment
+    # indicates other token, we need to keep token in both cases
+    elif commentBegin > 0 and token[:commentBegin].count('\"') % 2 == 0:
+      tokens.append(token[:commentBegin])
+      break
+    else:
+      tokens.append(token)
+  return tokens
+
+def first_tokens(stripped):
+  # the first two tokens of a line, which lazy loading makes do with. Words free of
+  # quotes, commas and comments are tokens as they are, so most lines skip the regex
+  words = stripped.split(None, 2)[:2]
+  for word in words:
+    if '"' in word or ',' in word or InterpreterBase.COMMENT_DEF in word:
+      return tokenize(stripped, 2)
+  return words
+
+def block_kind(stripped, tokens):
+  # validation keys off the first whitespace separated word before any comment, which
+  # is the first token unless something like a comma is glued onto it
+  if not tokens or (tokens[0] not in OPENERS and tokens[0] not in CLOSERS):
+    return None
+  word = tokens[0]
+  stripped = stripped.lstrip()
+  after = stripped[len(word):len(word)+1]
+  if stripped.startswith(word) and (not after or after == InterpreterBase.COMMENT_DEF or after.isspace()):
+    return word
+  return None
+
+# with heads, only the first_tokens of each line are kept, which is all validation needs.
+# With compact, indents and tokens are stored as they are lexed in flat arrays, see store.py
+def lex(it, program, heads=False, compact=False):
+  indents = array('I') if compact else []
+  tokenized_lines = store.TokenLines() if compact else []
+  jumps = {} # same jump table as validate_program returns
+  elses = {}
+  block_stk = [] # (opener line, closing keyword, indent) of each open block
+  indent_stk = [] # indents of open blocks, as tracked by indentation validation
+  bad_indent = None # first line with bad indentation, reported once blocks are known to be valid
+  last = len(program)-1
+
+  for i, line in enumerate(program):
+    stripped = line.lstrip(' ')
+    indent = len(line) - len(stripped)
+    tokens = (first_tokens(stripped) if heads else tokenize(stripped)) if stripped else []
+    indents.append(indent)
+    tokenized_lines.append(tokens)
+
+    # lines with no words before a comment take no part in validation
+    if not tokens and not stripped.split(InterpreterBase.COMMENT_DEF, 1)[0].strip():
+      continue
+    kind = block_kind(stripped, tokens)
+
+    # block structure, errors are raised right away since they take priority
+    if kind in OPENERS:
+      block_stk.append((i, OPENERS[kind], indent))
+    elif kind is not None:
+      if not block_stk:
+        it.error(ErrorType.SYNTAX_ERROR, f'Mismatched {kind} on line {i}', i)
+      top_item = block_stk.pop()
+      if kind == InterpreterBase.ELSE_DEF:
+        if top_item[1] == InterpreterBase.ENDIF_DEF and top_item[2] == indent:
+          block_stk.append(top_item)
+          jumps.setdefault(top_item[0], i)
+          elses.setdefault(top_item[0], []).append(i)
+        else:
+          it.error(ErrorType.SYNTAX_ERROR, f'Mismatched else', i)
+      else:
+        if top_item[1] != kind or top_item[2] != indent:
+          it.error(ErrorType.SYNTAX_ERROR, f'Missing {top_item[1]} for block on line {top_item[0]}', top_item[0])
+        jumps.setdefault(top_item[0], i)
+        for else_line in elses.pop(top_item[0], []):
+          jumps[else_line] = i
+
+    # indentation, which stops being tracked at the first bad line
+    if bad_indent is not None:
+      continue
+    if kind in OPENERS:
+      if indent_stk and indent <= indent_stk[-1]:
+        bad_indent = i
+      else:
+        indent_stk.append(indent)
+    elif not indent_stk:
+      # statements and closers outside of any block used to crash validate_program,
+      # they are reported as bad indentation wherever they appear
+      bad_indent = i
+      last = len(program)
+    elif kind is not None:
+      if indent != indent_stk[-1]:
+        bad_indent = i
+      elif kind != InterpreterBase.ELSE_DEF:
+        indent_stk.pop()
+    elif indent <= indent_stk[-1]:
+      bad_indent = i
+
+  # as in validate_program, a bad final line goes unreported
+  if bad_indent is not None and bad_indent < last:
+    it.error(ErrorType.SYNTAX_ERROR, f'Bad indentation on line {bad_indent}', bad_indent)
+  return indents, tokenized_lines, jumps
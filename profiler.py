@@ -0,0 +1,105 @@
+# Line level profiler used when an Interpreter is created with trace_output. Runs the
+# program one statement at a time, recording how often each line ran, the time spent
+# executing it and the deepest the block stack got. Per statement kind and per function
+# figures are derived from the line figures, so tracing adds just two clock reads per
+# statement, and runs without trace_output use the untraced loops with no overhead at all
+import json
+import sys
+import time
+
+from intbase import InterpreterBase, StepLimitExceeded
+
+class Profile:
+  def __init__(self, program):
+    self.program = program
+    self.counts = [0] * len(program.tokenized_lines) # executions of each line
+    self.times = [0.0] * len(program.tokenized_lines) # seconds spent executing each line
+    self.max_depth = 0 # deepest block stack seen
+    self.steps = 0
+    self.elapsed = 0.0
+
+  # runs interpreter it to completion, calling step to execute each statement. it.steps keeps
+  # counting from where an earlier step or resume left it, and max_steps limits that total
+  def run(self, it, step, max_steps=None):
+    counts = self.counts
+    times = self.times
+    clock = time.perf_counter
+    limit = max_steps if max_steps is not None else float('inf')
+    start = clock()
+    try:
+      while not it.terminated:
+        if it.steps >= limit:
+          raise StepLimitExceeded(f"program did not finish within {max_steps} steps")
+        ip = it.ip_
+        before = clock()
+        try:
+          step()
+        finally:
+          times[ip] += clock() - before
+          counts[ip] += 1
+          self.steps += 1
+          it.steps += 1
+          if len(it.block_stk) > self.max_depth:
+            self.max_depth = len(it.block_stk)
+    finally:
+      self.elapsed = clock() - start
+
+  def kinds(self):
+    # statement keyword -> [count, seconds]
+    kinds = {}
+    for i, tokens in enumerate(self.program.tokenized_lines):
+      if self.counts[i]:
+        totals = kinds.setdefault(tokens[0] if tokens else '', [0, 0.0])
+        totals[0] += self.counts[i]
+        totals[1] += self.times[i]
+    return kinds
+
+  def calls(self):
+    # called function (including print, input and strtoint) -> number of calls
+    calls = {}
+    for i, tokens in enumerate(self.program.tokenized_lines):
+      if self.counts[i] and len(tokens) >= 2 and tokens[0] == InterpreterBase.FUNCCALL_DEF:
+        calls[tokens[1]] = calls.get(tokens[1], 0) + self.counts[i]
+    return calls
+
+  def to_dict(self):
+    lines = self.program.lines
+    return {
+      'steps': self.steps,
+      'elapsed_s': self.elapsed,
+      'max_block_depth': self.max_depth,
+      'lines': [{'line': i, 'count': self.counts[i], 'time_s': self.times[i], 'source': lines[i]}
+                for i in self.hot_lines()],
+      'kinds': {kind: {'count': count, 'time_s': seconds} for kind, (count, seconds) in self.kinds().items()},
+      'calls': self.calls(),
+    }
+
+  def hot_lines(self, limit=None):
+    # executed lines, most expensive first
+    executed = [i for i in range(len(self.counts)) if self.counts[i]]
+    executed.sort(key=lambda i: (-self.times[i], i))
+    return executed[:limit] if limit is not None else executed
+
+  def report(self, limit=20):
+    lines = self.program.lines
+    out = [f'profile: {self.steps} statements in {self.elapsed:.6f}s, max block depth {self.max_depth}',
+           f'{"line":>6} {"count":>10} {"total ms":>11} {"per us":>9}  source']
+    for i in self.hot_lines(limit):
+      out.append(f'{i:>6} {self.counts[i]:>10} {self.times[i] * 1e3:>11.3f} {self.times[i] / self.counts[i] * 1e6:>9.2f}  {lines[i].strip()}')
+    out.append(f'{"kind":>10} {"count":>10} {"total ms":>11}')
+    for kind, (count, seconds) in sorted(self.kinds().items(), key=lambda item: -item[1][1]):
+      out.append(f'{kind:>10} {count:>10} {seconds * 1e3:>11.3f}')
+    calls = self.calls()
+    if calls:
+      out.append(f'{"function":>20} {"calls":>10}')
+      for name, count in sorted(calls.items(), key=lambda item: -item[1]):
+        out.append(f'{name:>20} {count:>10}')
+    return '\n'.join(out)
+
+  # trace_output is True to print the report to stderr, or a file path to
+  # also write the full profile there as JSON
+  def emit(self, trace_output):
+    print(self.report(), file=sys.stderr)
+    if isinstance(trace_output, str):
+      with open(trace_output, 'w') as f:
+        json.dump(self.to_dict(), f, indent=2)
@@ -0,0 +1,81 @@
+# On-disk cache of prepared programs, in the spirit of .pyc files. Each entry holds what
+# Interpreter.run derives from the source before executing it (indents, tokens, jump table,
+# function table, main entry points, variable slots and tail calls) in marshal's compact binary format.
+# Entries are keyed by a hash of the source together with a fingerprint of the modules
+# that prepare programs, so editing either the program or the interpreter invalidates them.
+# Caching is opt in (Interpreter(cache=True), Program.load(cache=True)) since hashing the source
+# costs more than it saves on a cold load, and entries are never evicted: it's for programs
+# loaded over and over, not for one off runs, and its directory can be deleted at any time
+import hashlib
+import marshal
+import os
+import tempfile
+
+CACHE_VERSION = 3
+MAGIC = b'BRWC' + CACHE_VERSION.to_bytes(2, 'little')
+SUFFIX = '.brc'
+# entries are MAGIC, then a digest of the marshalled data so a damaged entry (which could
+# still unmarshal, into some other program) reads as a miss, then the data itself
+DIGEST_SIZE = 16
+
+# the cache lives in $BREWIN_CACHE_DIR, or ~/.cache/brewin by default, as set when it's used
+def default_dir():
+  return os.environ.get('BREWIN_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'brewin')
+
+# modules whose code determines the cached data
+SOURCES = ('intbase.py', 'lexer.py', 'expression.py', 'program.py', 'progcache.py')
+
+def _fingerprint():
+  digest = hashlib.sha256(MAGIC)
+  here = os.path.dirname(os.path.abspath(__file__))
+  for name in SOURCES:
+    try:
+      with open(os.path.join(here, name), 'rb') as f:
+        digest.update(f.read())
+    except OSError:
+      digest.update(name.encode())
+  return digest.digest()
+
+FINGERPRINT = _fingerprint()
+
+def cache_key(program):
+  digest = hashlib.sha256(FINGERPRINT)
+  for line in program:
+    digest.update(line.encode('utf-8', 'surrogatepass'))
+    digest.update(b'\n')
+  return digest.hexdigest()
+
+def load(program, cache_dir=None):
+  # returns the prepared program, or None on a miss or an unreadable entry
+  path = os.path.join(cache_dir or default_dir(), cache_key(program) + SUFFIX)
+  try:
+    with open(path, 'rb') as f:
+      data = f.read()
+    payload = data[len(MAGIC)+DIGEST_SIZE:]
+    if not data.startswith(MAGIC) or data[len(MAGIC):len(MAGIC)+DIGEST_SIZE] != _digest(payload):
+      return None
+    return marshal.loads(payload)
+  except (OSError, EOFError, ValueError, TypeError):
+    return None
+
+def _digest(payload):
+  return hashlib.blake2b(payload, digest_size=DIGEST_SIZE).digest()
+
+def store(program, prepared, cache_dir=None):
+  # caching is best effort, a read-only or full disk just means no warm starts
+  cache_dir = cache_dir or default_dir()
+  try:
+    payload = marshal.dumps(prepared)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        f.write(MAGIC + _digest(payload))
+        f.write(payload)
+      # readers only ever see complete entries
+      os.replace(tmp_path, os.path.join(cache_dir, cache_key(program) + SUFFIX))
+    except BaseException:
+      os.unlink(tmp_path)
+      raise
+  except (OSError, ValueError):
+    pass
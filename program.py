@@ -0,0 +1,347 @@
+# A loaded Brewin program: the source plus everything derived from it before execution.
+# What a program does never changes once it's loaded, so one Program can be shared by any number
+# of interpreters, including interpreters running in other threads. Per-run state lives on the
+# Interpreter. Programs do fill in some of themselves as they're used: compiled code on first use,
+# and the tokens of lazily loaded functions on their first call. Those changes happen under the
+# program's lock, so interpreters in other threads see either none or all of each one
+from intbase import InterpreterBase
+from expression import assign_slots
+import checker
+import copy
+import lexer
+import operator
+import progcache
+import store
+import threading
+import transpiler
+import vm
+
+class Program:
+  def __init__(self, lines, indents, tokenized_lines, jumps, functions, main_lines, slots, tail_calls, optimize=True, lazy=False):
+    self.lines = lines # source lines
+    self.indents = indents # indent of each line
+    self.tokenized_lines = tokenized_lines # tokens of each line, just the first two in lines not loaded yet
+    self.jumps = jumps # maps each block opener (and else) to the line of its partner
+    self.functions = functions # maps each function name to the line defining it
+    self.main_lines = main_lines # lines defining main, normally just one
+    self.slots = slots # maps each variable name to its index in an interpreter's values
+    self.tail_calls = tail_calls # maps each funccall that ends a function to that function's endfunc
+    self.optimize = optimize # fold constants when compiling, off for differential testing
+    self.compact = isinstance(tokenized_lines, store.TokenLines) # lines, indents and tokens in flat buffers, see store.py
+    # lines that read input, where schedulers pause programs until input is available
+    self.input_lines = frozenset(i for i, tokens in enumerate(tokenized_lines) if self.reads_input(tokens))
+    # errors each line raises when run, and calls whose alignment is only known at runtime, see checker.py
+    self.static_errors = {}
+    self.dynamic_calls = set()
+    # lazily loaded programs start out with the first tokens of each line, which is all the scan
+    # at load time needs, and get the rest of a function's tokens when it first runs, see load_function.
+    # Lines are loaded a unit at a time: each top level function with everything nested in it, or a
+    # single line outside of functions. owners maps lines to the first line of their unit, and
+    # pending holds the units still to load
+    self.owners = None
+    self.pending = set()
+    self.enclosing = checker.enclosing_blocks(self)
+    self.regular = self.enclosing is not None # whether funccall alignment follows the block structure
+    if lazy:
+      self.owners, self.pending = self.find_units(lines, tokenized_lines, jumps)
+    else:
+      self.check(range(len(lines)))
+      self.enclosing = None # only needed for checking functions as they load
+    self.expressions = {} # compiled expression (or print/input arguments) for each line, built on first run
+    self.code = None # bytecode for the vm engine, built on first use
+    self.counted_code = None # bytecode for vm runs counting statements, see vm.py
+    self.skip = None # next statement from each line on, for compiling bytecode
+    self.python = None # python translation for the python engine, built on first use
+    self.lock = threading.RLock() # held while loading functions and installing compiled code
+
+  # reporter is used to raise validation errors, so that they are recorded on the interpreter running the program
+  # lazy programs are still validated in full, but only tokenize functions when they first run,
+  # so loading costs little more than reading the source and running uses memory for what runs.
+  # They don't use the cache, whose prepared form holds the tokens of every line.
+  # compact programs keep their source, indents and tokens in the flat buffers of store.py, for programs
+  # too big to hold as lists. The reference engine rebuilds each line's token list as it runs it, the
+  # other engines only read tokens while compiling. They don't use the cache either, which would read
+  # back lists, and can't also be lazy. lines can be store.SourceLines, as load_file maps them
+  @classmethod
+  def load(cls, lines, reporter=None, cache=False, optimize=True, lazy=False, compact=False):
+    if compact and lazy:
+      raise ValueError("compact programs can't be loaded lazily")
+    if not compact:
+      lines = list(lines)
+    elif not isinstance(lines, store.SourceLines):
+      lines = store.SourceLines.from_lines(list(lines))
+    cache = cache and not lazy and not compact
+    # a program that ran before can skip straight to its prepared form
+    prepared = progcache.load(lines) if cache else None
+    if prepared is not None:
+      return cls(lines, *prepared, optimize=optimize)
+
+    # tokenize everything and calculate indentations at beginning, validating the program
+    # in the same pass (which also matches up blocks, giving us every jump target up front).
+    # Everything else worked out at load time needs no more than the first two tokens of a line
+    indents, tokenized_lines, jumps = lexer.lex(reporter or InterpreterBase(console_output=False), lines, lazy, compact)
+    # give every variable a fixed slot so lookups are list indexing
+    slots = assign_slots(tokenized_lines)
+    functions, main_lines = cls.find_funcs(tokenized_lines)
+    tail_calls = cls.find_tail_calls(tokenized_lines, jumps)
+    if cache:
+      progcache.store(lines, (indents, tokenized_lines, jumps, functions, main_lines, slots, tail_calls))
+    return cls(lines, indents, tokenized_lines, jumps, functions, main_lines, slots, tail_calls, optimize, lazy)
+
+  # the program in the UTF-8 file at path, split into lines as str.splitlines splits them.
+  # Compact programs map the file instead of reading it
+  @classmethod
+  def load_file(cls, path, reporter=None, cache=False, optimize=True, lazy=False, compact=False):
+    if compact:
+      lines = store.SourceLines.open(path)
+    else:
+      with open(path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    return cls.load(lines, reporter, cache, optimize, lazy, compact)
+
+  @staticmethod
+  def find_funcs(tokenized_lines):
+    functions = {}
+    main_lines = []
+    for i, tokens in enumerate(tokenized_lines):
+      if (len(tokens) < 2):
+        continue
+      if tokens[0] == InterpreterBase.FUNC_DEF:
+        functions[tokens[1]] = i
+        if tokens[1] == "main":
+          main_lines.append(i)
+    return functions, main_lines
+
+  @staticmethod
+  def reads_input(tokens):
+    return bool(tokens) and (tokens[0] == InterpreterBase.INPUT_DEF or
+                             tokens[0] == InterpreterBase.FUNCCALL_DEF and len(tokens) >= 2 and tokens[1] == InterpreterBase.INPUT_DEF)
+
+  @staticmethod
+  def find_tail_calls(tokenized_lines, jumps, func_lines=None):
+    # a call to a user function that is the last statement before its function's endfunc
+    # has nothing left to do when the callee returns, so interpreters reuse the caller's
+    # frame for it. Being last also means it isn't inside any if or while, whose closers
+    # would come after it. func_lines limits the search to some functions
+    tail_calls = {}
+    for func_line in jumps if func_lines is None else func_lines:
+      end = jumps[func_line]
+      tokens = tokenized_lines[func_line]
+      if tokens[0] != InterpreterBase.FUNC_DEF or tokenized_lines[end] != [InterpreterBase.ENDFUNC_DEF]:
+        continue
+      last = end - 1
+      while last > func_line and not tokenized_lines[last]:
+        last -= 1
+      tokens = tokenized_lines[last]
+      if last > func_line and tokens[0] == InterpreterBase.FUNCCALL_DEF and len(tokens) >= 2 and tokens[1] not in lexer.BUILTINS:
+        tail_calls[last] = end
+    return tail_calls
+
+  @staticmethod
+  def find_units(lines, tokenized_lines, jumps):
+    owners = [None] * len(tokenized_lines)
+    pending = set()
+    i = 0
+    while i < len(tokenized_lines):
+      tokens = tokenized_lines[i]
+      end = i
+      if lexer.block_kind(lines[i], tokens) == InterpreterBase.FUNC_DEF:
+        # a function left open at the end of the program runs on to its last line
+        end = jumps.get(i, len(tokenized_lines)-1)
+      for j in range(i, end+1):
+        owners[j] = i
+      # blank lines have nothing more to load
+      if tokens or end > i:
+        pending.add(i)
+      i = end+1
+    return owners, pending
+
+  # the program with its source changed to lines. Edits that leave the block structure alone
+  # (every changed line, before and after, is a statement, blank or comment line inside a block)
+  # only tokenize and check the changed lines, shifting the line numbers of everything after
+  # them, and keep the compiled expressions and bytecode of unchanged lines as long as no
+  # variables are added (bytecode only while no lines are added or removed, either).
+  # Other edits, and lazy or compact programs, are loaded afresh (and cached, with cache) with
+  # validation errors raised as load raises them
+  def update(self, lines, reporter=None, cache=False):
+    lines = list(lines)
+    old = self.lines
+    if lines == old:
+      return self
+    if self.owners is not None or self.compact:
+      return Program.load(lines, reporter, cache, self.optimize, self.owners is not None, self.compact)
+    # the changed lines are old[start:old_end], which became lines[start:new_end]
+    common = min(len(old), len(lines))
+    differs = list(map(operator.ne, old, lines))
+    start = differs.index(True) if True in differs else common
+    differs = list(map(operator.ne, reversed(old), reversed(lines)))[:common-start]
+    suffix = differs.index(True) if True in differs else common-start
+    old_end = len(old) - suffix
+    new_end = len(lines) - suffix
+    tokens = [lexer.tokenize(line.lstrip(' ')) for line in lines[start:new_end]]
+    indents = [len(line) - len(line.lstrip(' ')) for line in lines[start:new_end]]
+    opener = self.enclosing_block(start, old_end)
+    if not self.only_statements(self.lines[start:old_end], self.tokenized_lines[start:old_end], opener, None) or \
+       not self.only_statements(lines[start:new_end], tokens, opener, indents) or not suffix:
+      return Program.load(lines, reporter, cache, self.optimize)
+
+    program = copy.copy(self)
+    program.lock = threading.RLock()
+    program.lines = lines
+    program.indents = self.indents[:start] + indents + self.indents[old_end:]
+    program.tokenized_lines = self.tokenized_lines[:start] + tokens + self.tokenized_lines[old_end:]
+    delta = new_end - old_end
+    shift = lambda i: i + delta if i >= old_end else i
+    outside = lambda i: i < start or i >= old_end
+    if delta:
+      program.jumps = {shift(a): shift(b) for a, b in self.jumps.items()}
+      program.functions = {name: shift(line) for name, line in self.functions.items()}
+      program.main_lines = [shift(line) for line in self.main_lines]
+    slots = assign_slots(tokens)
+    if any(name not in self.slots for name in slots):
+      program.slots = dict(self.slots)
+      for name in slots:
+        program.slots.setdefault(name, len(program.slots))
+    # the changed lines can only change which call ends the functions around them
+    funcs = [line for line in program.jumps if line < start and program.jumps[line] >= new_end and
+             program.tokenized_lines[line][0] == InterpreterBase.FUNC_DEF]
+    ends = {program.jumps[line] for line in funcs}
+    program.tail_calls = {shift(a): shift(b) for a, b in self.tail_calls.items() if shift(b) not in ends}
+    program.tail_calls.update(self.find_tail_calls(program.tokenized_lines, program.jumps, funcs))
+    program.input_lines = frozenset([shift(i) for i in self.input_lines if outside(i)] +
+                                    [start+k for k, line_tokens in enumerate(tokens) if self.reads_input(line_tokens)])
+    program.static_errors = {shift(i): error for i, error in self.static_errors.items() if outside(i)}
+    program.dynamic_calls = {shift(i) for i in self.dynamic_calls if outside(i)}
+    enclosing = {i: opener for i in range(start, new_end)} if self.regular else None
+    program.check(range(start, new_end), enclosing)
+    # compiled expressions are keyed by line and resolve names to slots, so only stay valid
+    # for unchanged lines, and only while names without slots stay that way
+    program.expressions = {}
+    if program.slots is self.slots:
+      program.expressions = {shift(i): expression for i, expression in self.expressions.items() if outside(i)}
+    program.code = None
+    program.counted_code = None
+    program.skip = None
+    program.python = None
+    # bytecode holds line numbers and slots, so is only patched while neither moves: the changed
+    # lines, and calls that started or stopped being tail calls, are compiled again. Code that
+    # skips blank lines also needs the same lines blank. Any other edit compiles the program
+    # again on its next run, and the python engine always translates it again
+    if delta == 0 and program.slots is self.slots:
+      lines_to_compile = set(range(start, new_end))
+      lines_to_compile.update(i for i in self.tail_calls.keys() | program.tail_calls.keys()
+                              if self.tail_calls.get(i) != program.tail_calls.get(i))
+      if self.counted_code is not None:
+        program.counted_code = self.patched(program, self.counted_code, lines_to_compile, range(len(lines)+1), True)
+      if self.code is not None and all(bool(a) == bool(b) for a, b in zip(self.tokenized_lines[start:old_end], tokens)):
+        program.skip = self.skip
+        program.code = self.patched(program, self.code, lines_to_compile, self.skip, False)
+    return program
+
+  @staticmethod
+  def patched(program, code, lines_to_compile, skip, counted):
+    code = list(code)
+    for i in lines_to_compile:
+      code[i] = vm.compile_line(program, i, skip, counted)
+    return code
+
+  def enclosing_block(self, start, end):
+    # the innermost block open around lines start to end that has no block keywords, from the jump table
+    opener = None
+    for line, partner in self.jumps.items():
+      if self.tokenized_lines[line][0] == InterpreterBase.ELSE_DEF:
+        continue
+      # ifs close at their endif, past any else
+      if self.tokenized_lines[partner][0] == InterpreterBase.ELSE_DEF:
+        partner = self.jumps[partner]
+      if line < start and partner >= end and (opener is None or line > opener):
+        opener = line
+    return opener
+
+  def only_statements(self, lines, tokenized_lines, opener, indents):
+    # whether lines are all statements, blank lines or comments. With indents, also that each
+    # is indented inside opener, as validation requires
+    for k, tokens in enumerate(tokenized_lines):
+      if tokens and (tokens[0] in lexer.OPENERS or tokens[0] in lexer.CLOSERS):
+        return False
+      if indents is not None and (tokens or lines[k].split(InterpreterBase.COMMENT_DEF, 1)[0].strip()):
+        if opener is None or indents[k] <= self.indents[opener]:
+          return False
+    return True
+
+  def check(self, lines, enclosing=None):
+    errors, dynamic_calls = checker.check(self, lines, enclosing if enclosing is not None else self.enclosing)
+    self.static_errors.update(errors)
+    self.dynamic_calls.update(dynamic_calls)
+
+  def load_function(self, line):
+    # loads the unit holding line, if it hasn't been already: tokenizes its lines, checks
+    # them and replaces their placeholders in the bytecode. Units leave pending last, so
+    # a unit not pending is fully loaded
+    start = self.owners[line]
+    if start not in self.pending:
+      return
+    with self.lock:
+      if start in self.pending:
+        self._load_unit(start)
+
+  def _load_unit(self, start):
+    end = start
+    while end+1 < len(self.owners) and self.owners[end+1] == start:
+      end += 1
+    for i in range(start, end+1):
+      self.tokenized_lines[i] = lexer.tokenize(self.lines[i].lstrip(' '))
+    self.check(range(start, end+1))
+    if self.code is not None:
+      for i in range(start, end+1):
+        self.code[i] = vm.compile_line(self, i, self.skip)
+    if self.counted_code is not None:
+      for i in range(start, end+1):
+        self.counted_code[i] = vm.compile_line(self, i, range(len(self.lines)+1), True)
+    self.pending.discard(start)
+
+  def bytecode(self, counted=False):
+    code = self.counted_code if counted else self.code
+    if code is not None:
+      return code
+    # counted code has every line go on to the next, as in the reference engine
+    skip = range(len(self.lines)+1) if counted else vm.skip_blank_lines(self.tokenized_lines)
+    # compiled without the lock so loading functions doesn't wait on it, which means units
+    # may have loaded since their placeholders were compiled
+    code = vm.compile_program(self, skip, counted)
+    with self.lock:
+      installed = self.counted_code if counted else self.code
+      if installed is not None:
+        return installed
+      if self.owners is not None:
+        for i, ins in enumerate(code):
+          if ins[vm.OP_IDX] == vm.LOAD and self.owners[i] not in self.pending:
+            code[i] = vm.compile_line(self, i, skip, counted)
+      if counted:
+        self.counted_code = code
+      else:
+        self.skip = skip
+        self.code = code
+    return code
+
+  def translation(self):
+    if self.python is None:
+      translation = transpiler.translate(self)
+      with self.lock:
+        if self.python is None:
+          self.python = translation
+    return self.python
+
+  # compiled closures can't be pickled, so programs sent to other processes recompile them there
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['expressions'] = {}
+    state['code'] = None
+    state['counted_code'] = None
+    state['python'] = None
+    del state['lock']
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.lock = threading.RLock()
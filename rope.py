@@ -0,0 +1,45 @@
+# Rope strings, so building a long string with repeated + takes linear rather than quadratic time.
+# Concatenations producing at least ROPE_MIN characters give a Rope, a view of the first count
+# chunks of a chunk list. Appending to the newest view of a list extends the list in place and
+# returns a longer view, leaving the shorter one valid. Ropes are only joined into a str (once,
+# the result is kept) when something needs the characters: comparisons, strtoint and printing.
+# To programs they are indistinguishable from str, Interpreter.compute flattens them before
+# reporting type errors, so messages still name <class 'str'>
+import itertools
+
+ROPE_MIN = 128
+
+class Rope:
+  __slots__ = ('chunks', 'count', 'length', 'flat')
+
+  def __init__(self, chunks, count, length):
+    self.chunks = chunks # shared by every rope made by appending to this one
+    self.count = count # chunks belonging to this rope
+    self.length = length
+    self.flat = None # the joined string, once needed
+
+  def __str__(self):
+    if self.flat is None:
+      self.flat = ''.join(itertools.islice(self.chunks, self.count))
+    return self.flat
+
+  def __len__(self):
+    return self.length
+
+  def __repr__(self):
+    return repr(str(self))
+
+def concat(a, b):
+  # a + b for any mix of str and Rope
+  length = len(a) + len(b)
+  if length < ROPE_MIN:
+    return str(a) + str(b)
+  if type(a) is Rope and a.flat is None and a.count == len(a.chunks):
+    chunks = a.chunks
+  else:
+    chunks = [str(a)]
+  chunks.append(str(b))
+  return Rope(chunks, len(chunks), length)
+
+def flatten(value):
+  return str(value) if type(value) is Rope else value
@@ -0,0 +1,66 @@
+# Runs many Brewin programs concurrently under asyncio. Each program runs a quantum of
+# statements at a time with Interpreter.step, then yields to the event loop, so thousands of
+# programs (and whatever else the loop is doing) get a fair share of the CPU and a runaway
+# loop only ever holds it for one quantum. Programs given an async input source pause before
+# each input statement until the next line arrives, instead of blocking the loop in input().
+#
+#   results = await run_all([(Interpreter(console_output=False), lines, QueueInput(queue)), ...],
+#                           max_steps=10**6, max_seconds=2.0)
+import asyncio
+import collections
+import time
+
+from intbase import StepLimitExceeded
+
+DEFAULT_QUANTUM = 1000
+
+# raised when a program has used up its time quota, which counts only time spent executing it
+class TimeLimitExceeded(Exception):
+  pass
+
+class QueueInput:
+  # async input source backed by an asyncio.Queue, putting None on the queue signals EOF
+  def __init__(self, queue=None):
+    self.queue = queue if queue is not None else asyncio.Queue()
+
+  async def read(self):
+    return await self.queue.get()
+
+async def run_program(interpreter, program, input=None, quantum=DEFAULT_QUANTUM, max_steps=None, max_seconds=None):
+  # runs program (source lines or a Program) on interpreter. input is an object with an async read()
+  # returning the next line, or None at EOF, otherwise the interpreter reads input as usual.
+  # Raises whatever the program raises, StepLimitExceeded or TimeLimitExceeded
+  interpreter.start(program)
+  pause_at = ()
+  if input is not None:
+    pending = collections.deque()
+    previous_get_input = interpreter.get_input
+    interpreter.get_input = pending.popleft
+    pause_at = interpreter.program.input_lines
+  seconds = 0.0
+  try:
+    while not interpreter.terminated:
+      if input is not None and interpreter.ip_ in pause_at:
+        pending.append(await input.read())
+      n = quantum
+      if max_steps is not None:
+        if interpreter.steps >= max_steps:
+          raise StepLimitExceeded(f"program did not finish within {max_steps} steps")
+        n = min(n, max_steps - interpreter.steps)
+      start = time.perf_counter()
+      interpreter.step(n, pause_at)
+      seconds += time.perf_counter() - start
+      if max_seconds is not None and seconds > max_seconds and not interpreter.terminated:
+        raise TimeLimitExceeded(f"program did not finish within {max_seconds} seconds")
+      # let every other program have its turn
+      await asyncio.sleep(0)
+  finally:
+    if input is not None:
+      interpreter.get_input = previous_get_input
+    interpreter.flush_output()
+
+async def run_all(jobs, **options):
+  # runs each (interpreter, program, input) job concurrently, options are as for run_program.
+  # Returns one entry per job in order: None if it finished, otherwise the exception it raised
+  return await asyncio.gather(*(run_program(interpreter, program, input, **options) for interpreter, program, input in jobs),
+                              return_exceptions=True)
@@ -0,0 +1,89 @@
+# Output sinks, for interpreters created with output_sink. By default an interpreter prints
+# every line and keeps all of them in output_log, which costs a write per line and memory
+# that grows for as long as the program prints. A sink receives each output line instead:
+#
+#   FdSink       buffers lines and writes them to a file descriptor in bulk
+#   CallbackSink hands each line to a function as it is printed
+#   RingSink     keeps only the last N lines for get_output()
+#   DiscardSink  drops everything
+#   ListSink     keeps every line, the default behavior as a sink
+#
+# Sinks implement write(line), flush() (called at the end of every run and before reading
+# from the keyboard), reset() (called by InterpreterBase.reset) and lines(), which is what
+# get_output() returns
+import collections
+import os
+
+class DiscardSink:
+  def write(self, v):
+    pass
+
+  def flush(self):
+    pass
+
+  def reset(self):
+    pass
+
+  def lines(self):
+    return []
+
+class ListSink(DiscardSink):
+  def __init__(self, console=False):
+    self.console = console
+    self.log = []
+
+  def write(self, v):
+    if self.console:
+      print(v)
+    self.log.append(v)
+
+  def reset(self):
+    self.log = []
+
+  def lines(self):
+    return self.log
+
+class RingSink(ListSink):
+  def __init__(self, maxlen, console=False):
+    self.maxlen = maxlen
+    super().__init__(console)
+    self.log = collections.deque(maxlen=maxlen)
+
+  def reset(self):
+    self.log = collections.deque(maxlen=self.maxlen)
+
+  def lines(self):
+    return list(self.log)
+
+class CallbackSink(DiscardSink):
+  def __init__(self, callback):
+    self.write = callback
+
+class FdSink(DiscardSink):
+  # lines are held until buffer_size characters are pending, then written with a single call
+  def __init__(self, fd=1, buffer_size=1 << 16, encoding='utf-8'):
+    self.fd = fd
+    self.buffer_size = buffer_size
+    self.encoding = encoding
+    self.pending = []
+    self.size = 0
+
+  def write(self, v):
+    v = str(v)
+    self.pending.append(v)
+    self.size += len(v) + 1
+    if self.size >= self.buffer_size:
+      self.flush()
+
+  def flush(self):
+    if not self.pending:
+      return
+    self.pending.append('')
+    data = memoryview('\n'.join(self.pending).encode(self.encoding))
+    self.pending = []
+    self.size = 0
+    while data:
+      data = data[os.write(self.fd, data):]
+
+  def reset(self):
+    self.flush()
@@ -0,0 +1,111 @@
+# Snapshots of a running interpreter, for warm restarts. A snapshot holds everything a run has
+# built up (variables, block stack, ip, statements run, output so far, input read so far) plus the
+# prepared program, in marshal's compact binary format, so restoring one costs no more than
+# unmarshalling it. Ropes are stored as plain strings and block stack entries as tuples.
+# The usual pattern runs a program's input-free setup once and forks runs from there:
+#
+#   run_until_input(interpreter, lines)
+#   data = snapshot(interpreter)
+#   ...
+#   fork = Interpreter(console_output=False, input=inputs)
+#   restore(fork, data)
+#   fork.resume()
+#
+# Restoring many times from one snapshot can pass the Program to restore, so it's only built once
+import marshal
+
+from intbase import ErrorType
+from expression import UNSET
+from frames import IfBlock, WhileBlock, CallFrame
+from program import Program
+from rope import flatten
+
+SNAPSHOT_VERSION = 2
+MAGIC = b'BRWS' + SNAPSHOT_VERSION.to_bytes(2, 'little')
+QUANTUM = 1000 # statements run_until_input runs between checks
+
+def run_until_input(it, program):
+  # starts program (source lines or a Program) on interpreter it and runs it up to its first
+  # input statement, or to the end. Returns whether the program has terminated
+  it.start(program)
+  pause_at = it.program.input_lines
+  while not it.terminated and it.ip_ not in pause_at:
+    it.step(QUANTUM, pause_at)
+  return it.terminated
+
+def snapshot(it, include_program=True):
+  # the state of interpreter it between statements, as bytes. Without include_program,
+  # restoring needs the Program passed in
+  program = it.program
+  state = {
+    'values': {name: flatten(it.values[slot]) for name, slot in program.slots.items() if it.values[slot] is not UNSET},
+    'block_stk': [_frame_state(frame) for frame in it.block_stk],
+    'ip': it.ip_,
+    'terminated': it.terminated,
+    'steps': it.steps,
+    'output': list(it.get_output()),
+    'input_cursor': it.input_cursor,
+    'error': (it.error_type.value if it.error_type is not None else None, it.error_line),
+    'lines': list(program.lines) if include_program else None,
+    'prepared': None,
+    'optimize': program.optimize,
+    'compact': program.compact,
+  }
+  # lazy and compact programs are restored from their source, the rest skip straight to their prepared form
+  if include_program and program.owners is None and not program.compact:
+    state['prepared'] = (program.indents, program.tokenized_lines, program.jumps, program.functions,
+                         program.main_lines, program.slots, program.tail_calls)
+  return MAGIC + marshal.dumps(state)
+
+def restore(it, data, program=None):
+  # sets interpreter it up to continue from a snapshot, with resume or step. Output in the
+  # snapshot goes into its output log (or output sink), and reading list input continues after
+  # the input already read. Raises ValueError for data that isn't a snapshot
+  if not data.startswith(MAGIC):
+    raise ValueError("not a snapshot, or one from another version")
+  state = marshal.loads(data[len(MAGIC):])
+  if program is None:
+    if state['lines'] is None:
+      raise ValueError("snapshot was taken without its program, which must be passed to restore")
+    if state['prepared'] is not None:
+      program = Program(state['lines'], *state['prepared'], optimize=state['optimize'])
+    elif state['compact']:
+      program = Program.load(state['lines'], it, it.cache, state['optimize'], compact=True)
+    else:
+      program = Program.load(state['lines'], it, it.cache, state['optimize'], lazy=True)
+  elif state['lines'] is not None and state['lines'] != program.lines:
+    raise ValueError("snapshot is of another program")
+
+  it.reset()
+  it.start(program)
+  for name, value in state['values'].items():
+    it.values[program.slots[name]] = value
+  it.block_stk = [_frame(entry) for entry in state['block_stk']]
+  it.ip_ = state['ip']
+  # everywhere the run can go next without a call must have its tokens
+  if program.pending:
+    for line in [it.ip_] + [getattr(frame, 'after_ip', None) for frame in it.block_stk]:
+      if line is not None and line < len(program.lines):
+        program.load_function(line)
+  it.terminated = state['terminated']
+  it.steps = state['steps']
+  for line in state['output']:
+    if it.output_sink is not None:
+      it.output_sink.write(line)
+    else:
+      it.output_log.append(line)
+  it.input_cursor = state['input_cursor']
+  error_type, it.error_line = state['error']
+  it.error_type = ErrorType(error_type) if error_type is not None else None
+
+def _frame_state(frame):
+  if type(frame) is IfBlock:
+    return (frame.kind, frame.indent, frame.taken)
+  if type(frame) is WhileBlock:
+    return (frame.kind, frame.indent, frame.while_ip, frame.after_ip)
+  return (frame.kind, frame.indent, frame.name, frame.after_ip, frame.main)
+
+_FRAMES = {IfBlock.kind: IfBlock, WhileBlock.kind: WhileBlock, CallFrame.kind: CallFrame}
+
+def _frame(entry):
+  return _FRAMES[entry[0]](*entry[1:])
@@ -0,0 +1,86 @@
+# Input sources, for interpreters created with input_source. Instead of a list holding all of
+# the input up front, a source reads lines lazily as input statements ask for them, so large
+# inputs use constant memory and the program starts running straight away:
+#
+#   FileSource  block buffered reads from a path, file descriptor or file object (pipes included)
+#   MmapSource  memory maps a file and splits lines straight out of the mapping
+#   IterSource  takes lines from any iterable, such as a generator
+#
+# Sources implement read(), which returns the next line without its line ending, or None once
+# the input is exhausted (just like running off the end of an input list), reset(), called by
+# InterpreterBase.reset to rewind where possible, and close()
+import mmap
+import os
+
+class IterSource:
+  def __init__(self, lines):
+    self.iterator = iter(lines)
+
+  def read(self):
+    return next(self.iterator, None)
+
+  def reset(self):
+    pass # iterators can't be rewound
+
+  def close(self):
+    pass
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+class FileSource(IterSource):
+  def __init__(self, file, buffer_size=1 << 16, encoding='utf-8'):
+    # file is a path, a file descriptor or an open text file; we only close what we opened
+    self.owned = not hasattr(file, 'readline')
+    if self.owned:
+      file = open(file, encoding=encoding, buffering=buffer_size, closefd=not isinstance(file, int))
+    self.file = file
+    self.start = self.file.tell() if self.file.seekable() else None
+
+  def read(self):
+    line = self.file.readline()
+    if not line:
+      return None
+    if line[-1:] == '\n':
+      line = line[:-2] if line[-2:-1] == '\r' else line[:-1]
+    return line
+
+  def reset(self):
+    if self.start is not None and not self.file.closed:
+      self.file.seek(self.start)
+
+  def close(self):
+    if self.owned:
+      self.file.close()
+
+class MmapSource(IterSource):
+  def __init__(self, path, encoding='utf-8'):
+    self.encoding = encoding
+    with open(path, 'rb') as f:
+      size = os.fstat(f.fileno()).st_size
+      # empty files can't be mapped, but there is nothing to read from them anyway
+      self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+    self.pos = 0
+
+  def read(self):
+    data = self.data
+    if self.pos >= len(data):
+      return None
+    end = data.find(b'\n', self.pos)
+    if end < 0:
+      end = len(data)
+    line = data[self.pos:end]
+    self.pos = end + 1
+    if line[-1:] == b'\r':
+      line = line[:-1]
+    return line.decode(self.encoding)
+
+  def reset(self):
+    self.pos = 0
+
+  def close(self):
+    if isinstance(self.data, mmap.mmap):
+      self.data.close()
@@ -0,0 +1,125 @@
+# Compact storage for big loaded programs. A list of token lists costs a list object per line and
+# a string object per token, several times the size of the source. Here every token is interned
+# once in the program's own symbol table (which goes when the program does), the tokens of all
+# lines are symbol ids in one flat array indexed by per-line offsets, and indents are a flat array too. Source lines stay in
+# their encoded form, mapped from the program's file when it has one, and are only decoded for the
+# rare things that need the text (validation, translation, profiles and snapshots).
+# TokenLines and SourceLines index like the lists they replace, token lines coming back as fresh
+# lists of the interned strings, so everything reading programs works on either
+from array import array
+from collections.abc import Sequence
+import itertools
+import mmap
+import os
+import re
+
+# everything str.splitlines splits on, in UTF-8
+LINE_BREAK_REGEX = re.compile(rb'\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]')
+
+class TokenLines(Sequence):
+  def __init__(self, names=None, ids=None, starts=None):
+    self.names = names if names is not None else [] # token of each symbol id
+    self.symbols = {name: symbol for symbol, name in enumerate(self.names)} # symbol id of each token
+    self.ids = ids if ids is not None else array('I') # symbol id of every token, line after line
+    self.starts = starts if starts is not None else array('Q', [0]) # where each line's tokens start in ids, and where the last one ends
+
+  def intern(self, token):
+    symbol = self.symbols.get(token)
+    if symbol is None:
+      symbol = self.symbols[token] = len(self.names)
+      self.names.append(token)
+    return symbol
+
+  def append(self, tokens):
+    self.ids.extend(map(self.intern, tokens))
+    self.starts.append(len(self.ids))
+
+  def __len__(self):
+    return len(self.starts) - 1
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return [self[k] for k in range(*i.indices(len(self)))]
+    if i < 0:
+      i += len(self)
+    try:
+      start, end = self.starts[i], self.starts[i+1]
+    except IndexError:
+      # running off the end of a program fails as it does with lists
+      raise IndexError("list index out of range") from None
+    names = self.names
+    return [names[symbol] for symbol in self.ids[start:end]]
+
+  def __iter__(self):
+    names = self.names
+    ids = self.ids
+    start = 0
+    for end in itertools.islice(self.starts, 1, None):
+      yield [names[symbol] for symbol in ids[start:end]]
+      start = end
+
+  # the symbol index is rebuilt from the names
+  def __reduce__(self):
+    return (TokenLines, (self.names, self.ids, self.starts))
+
+class SourceLines(Sequence):
+  def __init__(self, data, starts, ends):
+    self.data = data # the encoded source, bytes or a read only mmap
+    self.starts = starts # where each line starts in data
+    self.ends = ends # where each line ends in data, before its line break
+
+  @classmethod
+  def open(cls, path):
+    # the lines of a UTF-8 file, split as str.splitlines splits them, mapped rather than read in
+    with open(path, 'rb') as f:
+      size = os.fstat(f.fileno()).st_size
+      # empty files can't be mapped, but have no lines anyway
+      data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+    starts = array('Q')
+    ends = array('Q')
+    pos = 0
+    for match in LINE_BREAK_REGEX.finditer(data):
+      starts.append(pos)
+      ends.append(match.start())
+      pos = match.end()
+    if pos < len(data):
+      starts.append(pos)
+      ends.append(len(data))
+    return cls(data, starts, ends)
+
+  @classmethod
+  def from_lines(cls, lines):
+    # packs a list of lines, which may hold line breaks of their own
+    encoded = [line.encode('utf-8', 'surrogatepass') for line in lines]
+    starts = array('Q')
+    ends = array('Q')
+    pos = 0
+    for line in encoded:
+      starts.append(pos)
+      pos += len(line)
+      ends.append(pos)
+    return cls(b''.join(encoded), starts, ends)
+
+  def __len__(self):
+    return len(self.starts)
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return [self[k] for k in range(*i.indices(len(self)))]
+    return self.data[self.starts[i]:self.ends[i]].decode('utf-8', 'surrogatepass')
+
+  def __iter__(self):
+    data = self.data
+    for start, end in zip(self.starts, self.ends):
+      yield data[start:end].decode('utf-8', 'surrogatepass')
+
+  def __eq__(self, other):
+    if not isinstance(other, Sequence) or isinstance(other, str) or len(self) != len(other):
+      return False
+    return all(a == b for a, b in zip(self, other))
+
+  __hash__ = None
+
+  # maps can't be pickled, so pickles carry the bytes
+  def __reduce__(self):
+    return (SourceLines, (bytes(self.data), self.starts, self.ends))
@@ -0,0 +1,78 @@
+# Differential tests of the engines: the vm and python engines must give the same output, error
+# type and error line as the reference engine on every program, including ones that fail
+import os
+
+import pytest
+
+from interpreterv1 import Interpreter
+from program import Program
+from util import ENGINES, ProgramGenerator, run_program
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+def read_lines(path):
+  with open(path) as f:
+    return f.read().splitlines()
+
+ERRORING = {
+  'undefined_variable': ['func main', '  assign x + 1 y', 'endfunc'],
+  'undefined_function': ['func main', '  funccall print 1', '  funccall nope', 'endfunc'],
+  'type_error': ['func main', '  assign x + 1 "a"', 'endfunc'],
+  'mixed_comparison': ['func main', '  assign x == 1 True', 'endfunc'],
+  'bool_arithmetic': ['func main', '  assign x + True False', 'endfunc'],
+  'non_bool_if': ['func main', '  if + 1 2', '    funccall print 1', '  endif', 'endfunc'],
+  'non_bool_while': ['func main', '  while "x"', '  endwhile', 'endfunc'],
+  'bad_strtoint': ['func main', '  assign s "12a"', '  funccall strtoint s', 'endfunc'],
+  'misaligned_call': ['func main', '  funccall print "x"', 'funccall print "y"', 'endfunc'],
+  'mismatched_endif': ['func main', '  funccall print 1', '  endif', 'endfunc'],
+  'missing_endwhile': ['func main', '  while True', '  funccall print 1', 'endfunc'],
+  'bad_indentation': ['func main', '  if True', '  funccall print 1', '  endif', '  funccall print 2', 'endfunc'],
+  'assign_arguments': ['func main', '  funccall print 1', '  assign', 'endfunc'],
+  'bad_variable_name': ['func main', '  assign 1x 2', 'endfunc'],
+  'print_arguments': ['func main', '  funccall print', 'endfunc'],
+  'error_in_callee': ['func f', '  assign x - "a" 1', 'endfunc', 'func main', '  funccall print 1',
+                      '  funccall f', 'endfunc'],
+  'error_after_output': ['func main', '  assign i 0', '  while < i 5', '    funccall print i',
+                         '    assign i + i 1', '    if == i 3', '      assign x / i 0', '    endif',
+                         '  endwhile', 'endfunc'],
+}
+
+def assert_same_on_all_engines(program, input=()):
+  results = {engine: run_program(program, engine, input) for engine in ENGINES}
+  for engine in ENGINES[1:]:
+    assert results[engine] == results[Interpreter.REFERENCE_ENGINE], engine
+  return results[Interpreter.REFERENCE_ENGINE]
+
+def test_test69():
+  program = read_lines(os.path.join(ROOT, 'test69.src'))
+  output, error, message = assert_same_on_all_engines(program)
+  assert output == read_lines(os.path.join(ROOT, 'test69.exp'))
+  assert error == (None, None) and message is None
+  # the python engine ran the program itself rather than handing it to the reference engine
+  assert Program.load(program).translation().code is not None
+
+@pytest.mark.parametrize('name', sorted(ERRORING))
+def test_erroring_programs(name):
+  output, error, message = assert_same_on_all_engines(ERRORING[name])
+  assert message is not None
+
+def test_deep_recursion():
+  program = ['func f', '  if > n 0', '    assign n - n 1', '    funccall f', '    assign k + k 1', '  endif', 'endfunc',
+             'func main', '  assign n 5000', '  assign k 0', '  funccall f', '  funccall print n k', 'endfunc']
+  assert assert_same_on_all_engines(program) == (['05000'], (None, None), None)
+
+def test_input():
+  program = ['func main', '  funccall input "n? "', '  funccall strtoint result', '  assign n result',
+             '  funccall input "m? "', '  assign n + n 1', '  funccall print n result', 'endfunc']
+  output, error, message = assert_same_on_all_engines(program, ['41', 'x'])
+  assert output == ['n? ', 'm? ', '42x']
+
+@pytest.mark.parametrize('seed', range(200))
+def test_generated_programs(seed):
+  assert_same_on_all_engines(ProgramGenerator(seed).program())
+
+def test_generated_programs_cover_errors():
+  # the generated programs exercise both paths
+  failed = sum(run_program(ProgramGenerator(seed).program())[2] is not None for seed in range(200))
+  assert 10 < failed < 190
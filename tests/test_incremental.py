@@ -0,0 +1,155 @@
+# Program.update must give the program a fresh Program.load gives, whether it patches the
+# previous program (edits to statements inside blocks) or loads afresh (edits to block keywords)
+import random
+
+import pytest
+
+from interpreterv1 import Interpreter
+from program import Program
+from util import ENGINES, ProgramGenerator, outcome, run_program
+
+ATTRIBUTES = ('lines', 'indents', 'tokenized_lines', 'jumps', 'functions', 'main_lines', 'tail_calls',
+              'input_lines', 'static_errors', 'dynamic_calls')
+
+BASE = ['func count',
+        '  assign n + n 1',
+        '  funccall print "count " n',
+        'endfunc',
+        'func loop',
+        '  if > n 3',
+        '    return',
+        '  endif',
+        '  funccall count',
+        '  funccall loop',
+        'endfunc',
+        'func main',
+        '  assign n 0',
+        '  funccall input "go? "',
+        '  funccall print result',
+        '',
+        '  funccall loop',
+        '  funccall print "done " n',
+        'endfunc']
+
+def edit(lines, start, end, *replacement):
+  return lines[:start] + list(replacement) + lines[end:]
+
+EDITS = {
+  # (edited program, whether update patches the previous program)
+  'change_statement': (edit(BASE, 2, 3, '  funccall print "n is " n'), True),
+  'add_variable': (edit(BASE, 2, 3, '  assign m * n 10', '  funccall print n " " m'), True),
+  'add_variables_before_use': (edit(BASE, 12, 13, '  assign first 1', '  assign n - first 1'), True),
+  'delete_lines': (edit(BASE, 14, 16), True),
+  'add_comment_and_blank': (edit(BASE, 1, 1, '  # counting', ''), True),
+  'add_input': (edit(BASE, 15, 15, '  funccall input "again? "', '  funccall print result'), True),
+  'remove_input': (edit(BASE, 13, 15), True),
+  'input_statement': (edit(BASE, 13, 14, '  input "go? "'), True),
+  # loop no longer ends with a call, so its call to itself isn't a tail call anymore
+  'tail_call_removed': (edit(BASE, 9, 10, '  funccall loop', '  funccall print "back"'), True),
+  # count now ends with a call to loop
+  'tail_call_added': (edit(BASE, 3, 3, '  funccall loop'), True),
+  'tail_call_changed': (edit(BASE, 9, 10, '  funccall count'), True),
+  'static_error': (edit(BASE, 2, 3, '  funccall nope'), True),
+  'misaligned_call': (edit(BASE, 2, 3, 'funccall print n'), False),
+  'add_if': (edit(BASE, 2, 3, '  if > n 1', '    funccall print n', '  endif'), False),
+  'remove_endif': (edit(BASE, 7, 8), False),
+  'rename_function': (edit(BASE, 0, 1, 'func counter'), False),
+  'break_structure': (edit(BASE, 4, 5, 'endfunc'), False),
+  'edit_last_line': (edit(BASE, 18, 19, 'endfunc # main'), False),
+}
+
+def run_edited(before, after, engine, input, max_steps=None, **options):
+  it = Interpreter(console_output=False, input=list(input), engine=engine, incremental=True, **options)
+  outcome(it, lambda: it.run(before, max_steps))
+  it.reset()
+  return outcome(it, lambda: it.run(after, max_steps))
+
+@pytest.mark.parametrize('name', sorted(EDITS))
+def test_update_matches_load(name, monkeypatch):
+  lines, patched = EDITS[name]
+  base = Program.load(BASE)
+  # with its expressions compiled, which patching carries over
+  run_program(base, input=['y', 'y'])
+  loads = []
+  load = Program.load.__func__
+  monkeypatch.setattr(Program, 'load', classmethod(lambda cls, *args, **kwargs: loads.append(args) or load(cls, *args, **kwargs)))
+  try:
+    updated = base.update(lines)
+  except Exception:
+    updated = None
+  assert (not loads) == patched
+  monkeypatch.undo()
+  try:
+    fresh = Program.load(lines)
+  except Exception:
+    assert updated is None
+    return
+  if name in ('tail_call_removed', 'tail_call_added'):
+    assert updated.tail_calls != base.tail_calls
+  for attribute in ATTRIBUTES:
+    assert getattr(updated, attribute) == getattr(fresh, attribute), attribute
+  assert set(updated.slots) == set(fresh.slots)
+
+# step limits run the counted bytecode, which is patched separately
+@pytest.mark.parametrize('name', sorted(EDITS))
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('max_steps', (None, 1000))
+def test_incremental_runs(name, engine, max_steps):
+  lines = EDITS[name][0]
+  assert run_edited(BASE, lines, engine, ['y', 'y'], max_steps) == run_program(lines, engine, ['y', 'y'], max_steps)
+
+@pytest.mark.parametrize('name, code_patched', [('change_statement', True), ('tail_call_changed', True),
+                                                ('static_error', True), ('add_variable', False)])
+def test_bytecode_is_patched(name, code_patched):
+  base = Program.load(BASE)
+  base.bytecode()
+  base.bytecode(True)
+  updated = base.update(EDITS[name][0])
+  assert (updated.code is not None) == code_patched
+  assert (updated.counted_code is not None) == code_patched
+  assert updated.code is not base.code
+
+def test_blank_line_edit_patches_counted_bytecode_only():
+  base = Program.load(BASE)
+  base.bytecode()
+  base.bytecode(True)
+  lines = edit(BASE, 15, 16, '  funccall print "again"')
+  updated = base.update(lines)
+  assert updated.code is None and updated.counted_code is not None
+  for max_steps in (None, 1000):
+    assert run_program(updated, input=['y'], engine=Interpreter.VM_ENGINE, max_steps=max_steps) == \
+           run_program(lines, input=['y'], engine=Interpreter.VM_ENGINE, max_steps=max_steps)
+
+def test_unchanged_program_is_reused():
+  base = Program.load(BASE)
+  assert base.update(list(BASE)) is base
+
+def test_update_keeps_the_original():
+  base = Program.load(BASE)
+  before = run_program(base, input=['y'])
+  base.update(EDITS['add_variable'][0])
+  assert run_program(base, input=['y']) == before
+
+def random_edit(rng, lines):
+  lines = list(lines)
+  pool = lines + ['  assign zz + 1 2', '    funccall print zz', '  funccall input "?"', '', '  # note']
+  for _ in range(rng.randint(1, 3)):
+    i = rng.randrange(len(lines) + 1)
+    if rng.random() < 0.4 and i < len(lines):
+      lines[i] = rng.choice(pool)
+    elif rng.random() < 0.7 or i == len(lines):
+      lines.insert(i, rng.choice(pool))
+    else:
+      del lines[i]
+  return lines
+
+@pytest.mark.parametrize('seed', range(40))
+def test_random_edits(seed):
+  rng = random.Random(seed)
+  before = ProgramGenerator(seed).program()
+  for _ in range(5):
+    after = random_edit(rng, before)
+    for engine in ENGINES:
+      assert run_edited(before, after, engine, ['1', '2']) == run_program(after, engine, ['1', '2'])
+      assert run_edited(before, after, engine, ['1', '2'], 500) == run_program(after, engine, ['1', '2'], 500)
+    before = after
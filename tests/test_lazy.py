@@ -0,0 +1,36 @@
+# Lazily loaded programs run as eagerly loaded ones do, including when interpreters in several
+# threads share one Program and load its functions (and compile its code) at the same time
+import threading
+
+import pytest
+
+from program import Program
+from interpreterv1 import Interpreter
+from util import ENGINES, ProgramGenerator, run_program
+
+def many_functions(count):
+  lines = []
+  for f in range(count):
+    lines += [f'func f{f}', '  assign x + x 1', '  funccall print x', 'endfunc']
+  return lines + ['func main', '  assign x 0'] + [f'  funccall f{f}' for f in range(0, count, 7)] + ['endfunc']
+
+@pytest.mark.parametrize('seed', range(30))
+@pytest.mark.parametrize('engine', ENGINES)
+def test_lazy_matches_eager(seed, engine):
+  lines = ProgramGenerator(seed).program()
+  assert run_program(lines, engine, lazy=True) == run_program(lines, engine)
+
+@pytest.mark.parametrize('trial', range(5))
+def test_shared_lazy_program_across_threads(trial):
+  lines = many_functions(2000)
+  expected = run_program(lines)
+  program = Program.load(lines, lazy=True)
+  results = {}
+  def run(name, engine):
+    results[name] = run_program(program, engine)
+  threads = [threading.Thread(target=run, args=(f'{engine}{i}', engine)) for i in range(2) for engine in ENGINES]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert all(result == expected for result in results.values())
@@ -0,0 +1,66 @@
+# Constant folding (optimize=True) must never change what a program does: each program here runs
+# the same with optimize on and off, on every engine, while the folds that should happen do
+import pytest
+
+from expression import compile_expression, constant_of, UNSET
+from program import Program
+from util import ENGINES, run_program
+import vm
+
+def main(*body):
+  return ['func main', *('  ' + line for line in body), 'endfunc']
+
+PROGRAMS = {
+  'folded_int': main('assign x + 1 * 2 3', 'assign y - / 7 2 % 9 4', 'funccall print x " " y'),
+  'folded_string': main('assign s + "ab" + "c" "d"', 'funccall print s'),
+  'folded_comparisons': main('assign p < 1 2', 'assign q == "a" "b"', 'assign r != True False', 'funccall print p q r'),
+  'partly_constant': main('assign x 4', 'assign y + x * 2 3', 'funccall print y'),
+  'and_false_bool': main('assign p True', 'assign q & False p', 'funccall print q'),
+  'and_true_bool': main('assign p False', 'assign q & p True', 'funccall print q'),
+  'or_true_bool': main('assign p False', 'assign q | True p', 'funccall print q'),
+  'or_false_bool': main('assign p True', 'assign q | p False', 'funccall print q'),
+  'and_false_int': main('assign x 1', 'assign q & False x', 'funccall print q'),
+  'or_true_string': main('assign s "a"', 'assign q | s True', 'funccall print q'),
+  'and_false_undefined': main('assign q & False nope', 'funccall print q'),
+  'if_true': main('if True', '  funccall print "then"', 'else', '  funccall print "else"', 'endif'),
+  'if_false': main('if False', '  funccall print "then"', 'else', '  funccall print "else"', 'endif'),
+  'if_folded_false': main('if == 1 2', '  funccall print "then"', 'endif', 'funccall print "after"'),
+  'if_true_in_loop': main('assign i 0', 'while < i 3', '  if True', '    funccall print i', '  endif',
+                          '  assign i + i 1', 'endwhile'),
+  'if_constant_int': main('if + 1 2', '  funccall print "then"', 'endif'),
+  'divide_by_zero': main('funccall print "before"', 'assign x / 1 0', 'funccall print "after"'),
+  'modulo_by_zero': main('assign x % 5 0'),
+  'divide_by_zero_skipped': main('if False', '  assign x / 1 0', 'endif', 'funccall print "fine"'),
+  'mismatched_types': main('funccall print "before"', 'assign x + 1 "a"'),
+  'mismatched_comparison': main('assign x < "a" 1'),
+  'mismatched_skipped': main('if == 1 2', '  assign x + 1 "a"', 'endif', 'funccall print "fine"'),
+  'bool_arithmetic': main('assign x + True False'),
+}
+
+@pytest.mark.parametrize('name', sorted(PROGRAMS))
+@pytest.mark.parametrize('engine', ENGINES)
+def test_optimize_changes_nothing(name, engine):
+  optimized = run_program(PROGRAMS[name], engine, optimize=True)
+  assert optimized == run_program(PROGRAMS[name], engine, optimize=False)
+
+def fold(expression, optimize=True):
+  return constant_of(compile_expression(expression.split(), {}, optimize))
+
+def test_constant_subexpressions_fold():
+  assert fold('+ 1 * 2 3') == 7
+  assert fold('+ "ab" "c"') == 'abc'
+  assert fold('& True < 1 2') is True
+  assert fold('+ 1 * 2 3', optimize=False) is UNSET
+
+@pytest.mark.parametrize('expression', ['/ 1 0', '% 5 0', '+ 1 "a"', '< "a" 1', '+ True False', '== 1 True'])
+def test_failing_operations_dont_fold(expression):
+  # they raise when (and only if) their line runs
+  assert fold(expression) is UNSET
+
+def test_constant_conditions_compile_to_jumps():
+  lines = main('if True', '  funccall print 1', 'endif', 'if == 1 2', '  funccall print 2', 'endif')
+  ops = [ins[vm.OP_IDX] for ins in Program.load(lines).bytecode()]
+  assert ops[1] == vm.IF_TAKEN and ops[4] == vm.IF_SKIPPED
+  # literal conditions are constant either way, only the comparison needs folding
+  ops = [ins[vm.OP_IDX] for ins in Program.load(lines, optimize=False).bytecode()]
+  assert ops[1] == vm.IF_TAKEN and ops[4] == vm.IF
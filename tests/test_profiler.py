@@ -0,0 +1,43 @@
+# Traced runs (trace_output, see profiler.py) must run programs exactly as untraced runs do,
+# step limits included, whether they run from the start or resume a partly stepped program
+import json
+
+import pytest
+
+from interpreterv1 import Interpreter
+from intbase import StepLimitExceeded
+from util import ENGINES, outcome
+
+LOOP = ['func main',
+        '  assign i 0',
+        '  while < i 100',
+        '    assign i + i 1',
+        '  endwhile',
+        '  funccall print i',
+        'endfunc']
+
+def stepped_then_resumed(engine, max_steps, **options):
+  it = Interpreter(console_output=False, engine=engine, **options)
+  it.start(LOOP)
+  it.step(150)
+  return outcome(it, lambda: it.resume(max_steps)), it.steps
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('max_steps', (200, 1000))
+def test_traced_resume_counts_earlier_steps(engine, max_steps, tmp_path):
+  traced = stepped_then_resumed(engine, max_steps, trace_output=str(tmp_path / 'profile.json'))
+  assert traced == stepped_then_resumed(engine, max_steps)
+  if max_steps == 200:
+    assert traced[1] == 200
+    assert traced[0][2] == str(StepLimitExceeded('program did not finish within 200 steps'))
+  # the profile only covers the resumed statements
+  with open(tmp_path / 'profile.json') as f:
+    assert json.load(f)['steps'] == traced[1] - 150
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_traced_run_matches_untraced(engine, tmp_path):
+  it = Interpreter(console_output=False, engine=engine, trace_output=str(tmp_path / 'profile.json'))
+  traced = outcome(it, lambda: it.run(LOOP, 1000))
+  untraced = Interpreter(console_output=False, engine=engine)
+  assert traced == outcome(untraced, lambda: untraced.run(LOOP, 1000))
+  assert it.steps == untraced.steps
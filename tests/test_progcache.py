@@ -0,0 +1,116 @@
+# The on-disk program cache (progcache.py): a warm load must give the program a cold load gives,
+# and anything that could make an entry stale or unreadable must make it a miss instead
+import os
+
+import pytest
+
+from interpreterv1 import Interpreter
+from program import Program
+from util import ENGINES, run_program
+import lexer
+import progcache
+
+LINES = ['func double',
+         '  assign result * 2 n',
+         'endfunc',
+         'func main',
+         '  assign n 1',
+         '  while < n 50',
+         '    funccall double',
+         '    assign n result',
+         '  endwhile',
+         '  funccall print "n is " n',
+         'endfunc']
+
+ATTRIBUTES = ('lines', 'indents', 'tokenized_lines', 'jumps', 'functions', 'main_lines', 'slots', 'tail_calls',
+              'input_lines', 'static_errors', 'dynamic_calls')
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+  monkeypatch.setenv('BREWIN_CACHE_DIR', str(tmp_path))
+  return tmp_path
+
+@pytest.fixture
+def lexed(monkeypatch):
+  # the lines of each program lexed, which only a cache miss does
+  lexed = []
+  lex = lexer.lex
+  monkeypatch.setattr(lexer, 'lex', lambda reporter, lines, *args: lexed.append(list(lines)) or lex(reporter, lines, *args))
+  return lexed
+
+def entries(cache_dir):
+  return [path for path in cache_dir.iterdir() if path.suffix == progcache.SUFFIX]
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_warm_load_matches_cold_load(cache_dir, lexed, engine):
+  cold = Program.load(LINES, cache=True)
+  warm = Program.load(LINES, cache=True)
+  assert len(lexed) == 1
+  assert len(entries(cache_dir)) == 1
+  for attribute in ATTRIBUTES:
+    assert getattr(warm, attribute) == getattr(cold, attribute), attribute
+  assert run_program(warm, engine) == run_program(cold, engine) == run_program(LINES, engine)
+
+def test_interpreter_uses_the_cache(cache_dir, lexed):
+  for _ in range(2):
+    it = Interpreter(console_output=False, cache=True)
+    it.run(LINES)
+    assert it.get_output() == ['n is 64']
+  assert len(lexed) == 1
+
+def test_no_cache_by_default(cache_dir, lexed):
+  Program.load(LINES)
+  Program.load(LINES)
+  assert len(lexed) == 2
+  assert not entries(cache_dir)
+
+def test_edited_source_misses(cache_dir, lexed):
+  edited = list(LINES)
+  edited[4] = '  assign n 3'
+  expected = run_program(edited)
+  lexed.clear()
+  Program.load(LINES, cache=True)
+  assert run_program(Program.load(edited, cache=True)) == expected
+  assert lexed == [LINES, edited]
+  assert len(entries(cache_dir)) == 2
+
+def test_changed_fingerprint_misses(cache_dir, lexed, monkeypatch):
+  Program.load(LINES, cache=True)
+  # as after editing one of progcache.SOURCES
+  monkeypatch.setattr(progcache, 'FINGERPRINT', progcache.FINGERPRINT[::-1])
+  Program.load(LINES, cache=True)
+  assert len(lexed) == 2
+
+def damaged(data):
+  yield b''
+  yield data[:len(progcache.MAGIC)]
+  yield data[:len(data) // 2]
+  yield data[:-1]
+  yield b'BRWC\x01\x00' + data[len(progcache.MAGIC):]
+  # a flipped bit anywhere, which could still unmarshal into some other program
+  for i in range(0, len(data), 7):
+    yield data[:i] + bytes([data[i] ^ 1]) + data[i+1:]
+
+def test_damaged_entries_miss(cache_dir, lexed):
+  expected = run_program(LINES)
+  lexed.clear()
+  Program.load(LINES, cache=True)
+  path, = entries(cache_dir)
+  data = path.read_bytes()
+  for count, bad_data in enumerate(damaged(data), 2):
+    path.write_bytes(bad_data)
+    assert run_program(Program.load(LINES, cache=True), max_steps=10000) == expected
+    assert len(lexed) == count
+    # and the miss stored a good entry in its place
+    assert path.read_bytes() == data
+
+def test_unwritable_cache_dir_is_ignored(tmp_path, monkeypatch, lexed):
+  blocker = tmp_path / 'file'
+  blocker.write_text('')
+  monkeypatch.setenv('BREWIN_CACHE_DIR', str(blocker / 'cache'))
+  expected = run_program(LINES)
+  lexed.clear()
+  assert run_program(Program.load(LINES, cache=True)) == expected
+  Program.load(LINES, cache=True)
+  assert len(lexed) == 2
+  assert not os.path.exists(blocker / 'cache')
@@ -0,0 +1,125 @@
+# The asyncio scheduler (scheduler.py): jobs take turns a quantum at a time, so a runaway
+# program can't starve the others, quotas stop it, and async input reaches the program
+# exactly as an input list would
+import asyncio
+import time
+
+import pytest
+
+from interpreterv1 import Interpreter
+from intbase import StepLimitExceeded
+from util import ENGINES, outcome, run_program
+import scheduler
+import sinks
+
+RUNAWAY = ['func main',
+           '  assign i 0',
+           '  while True',
+           '    assign i + i 1',
+           '  endwhile',
+           'endfunc']
+
+COUNT = ['func main',
+         '  assign i 0',
+         '  while < i 2000',
+         '    assign i + i 1',
+         '  endwhile',
+         '  funccall print "counted " i',
+         'endfunc']
+
+ECHO = ['func main',
+        '  funccall input "first? "',
+        '  funccall print "got " result',
+        '  funccall input "second? "',
+        '  funccall strtoint result',
+        '  assign doubled * 2 result',
+        '  funccall print "doubled " doubled',
+        '  funccall input "third? "',
+        '  funccall print "then " result',
+        'endfunc']
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_runaway_loop_is_interleaved_and_stopped(engine):
+  runaway = Interpreter(console_output=False, engine=engine)
+  # the runaway program's progress whenever another job prints
+  progress = []
+  others = [Interpreter(console_output=False, engine=engine, output_sink=sinks.CallbackSink(lambda line: progress.append(runaway.steps)))
+            for _ in range(3)]
+  jobs = [(runaway, RUNAWAY, None)] + [(it, COUNT, None) for it in others]
+  results = asyncio.run(scheduler.run_all(jobs, quantum=100, max_steps=50000))
+  assert isinstance(results[0], StepLimitExceeded)
+  assert results[1:] == [None] * 3
+  assert runaway.steps == 50000
+  # every other job finished long before the runaway one used up its steps
+  assert len(progress) == 3 and all(0 < steps < 20000 for steps in progress)
+  assert all(it.steps == others[0].steps for it in others)
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('max_steps', (1, 99, 100, 101, 2500))
+def test_step_quota_matches_interpreter(engine, max_steps):
+  it = Interpreter(console_output=False, engine=engine)
+  result, = asyncio.run(scheduler.run_all([(it, COUNT, None)], quantum=100, max_steps=max_steps))
+  expected = Interpreter(console_output=False, engine=engine)
+  expected_outcome = outcome(expected, lambda: expected.run(COUNT, max_steps))
+  assert (list(it.get_output()), str(result) if result is not None else None) == (expected_outcome[0], expected_outcome[2])
+  assert it.steps == expected.steps
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_time_quota(engine):
+  runaway = Interpreter(console_output=False, engine=engine)
+  counter = Interpreter(console_output=False, engine=engine)
+  start = time.perf_counter()
+  results = asyncio.run(scheduler.run_all([(runaway, RUNAWAY, None), (counter, COUNT, None)], max_seconds=0.2))
+  assert isinstance(results[0], scheduler.TimeLimitExceeded)
+  assert results[1] is None
+  assert counter.get_output() == ['counted 2000']
+  assert time.perf_counter() - start < 5
+
+async def feed(queue, lines, delay=0.001):
+  # puts lines on queue a little at a time, as they might arrive over a network
+  for line in lines:
+    await asyncio.sleep(delay)
+    await queue.put(line)
+
+async def run_with_queue(engine, lines, **options):
+  it = Interpreter(console_output=False, engine=engine)
+  source = scheduler.QueueInput()
+  producer = asyncio.create_task(feed(source.queue, lines))
+  result, = await scheduler.run_all([(it, ECHO, source)], **options)
+  await producer
+  return it, result
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('quantum', (1, 1000))
+def test_queue_input(engine, quantum):
+  it, result = asyncio.run(run_with_queue(engine, ['a', '21', 'b'], quantum=quantum))
+  assert result is None
+  assert it.get_output() == run_program(ECHO, engine, ['a', '21', 'b'])[0]
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_queue_input_eof(engine):
+  # None is the end of input, which the program sees as running off the end of an input list
+  it, result = asyncio.run(run_with_queue(engine, ['a', '21', None]))
+  assert result is None
+  assert it.get_output() == run_program(ECHO, engine, ['a', '21'])[0]
+  assert it.get_output()[-1] == 'then None'
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_queue_input_errors_like_list_input(engine):
+  it, result = asyncio.run(run_with_queue(engine, ['a', 'x', 'b']))
+  expected = run_program(ECHO, engine, ['a', 'x', 'b'])
+  assert (list(it.get_output()), it.get_error_type_and_line(), str(result)) == expected
+
+def test_waiting_for_input_lets_others_run():
+  async def main():
+    waiting = Interpreter(console_output=False)
+    source = scheduler.QueueInput()
+    counter = Interpreter(console_output=False)
+    task = asyncio.ensure_future(scheduler.run_all([(waiting, ECHO, source), (counter, COUNT, None)], quantum=10))
+    # the counter finishes while the other job still waits, before its first input statement
+    while counter.get_output() != ['counted 2000']:
+      await asyncio.sleep(0)
+    assert waiting.get_output() == [] and waiting.ip_ == 1
+    await feed(source.queue, ['a', '1', None])
+    return await task
+  assert asyncio.run(main()) == [None, None]
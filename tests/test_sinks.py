@@ -0,0 +1,101 @@
+# Output sinks (sinks.py) must see exactly the lines a run without a sink keeps in get_output(),
+# on every engine, whether the run finishes or fails part way through
+import os
+
+import pytest
+
+from interpreterv1 import Interpreter
+from util import ENGINES, ProgramGenerator, outcome, run_program
+import sinks
+
+COUNT = ['func main',
+         '  assign i 0',
+         '  while < i 50',
+         '    funccall print "line " i',
+         '    assign i + i 1',
+         '  endwhile',
+         'endfunc']
+
+# prints, then fails at runtime
+FAILS = ['func main',
+         '  funccall print "before"',
+         '  funccall print "still before"',
+         '  assign x + 1 "a"',
+         '  funccall print "after"',
+         'endfunc']
+
+PROGRAMS = [COUNT, FAILS] + [ProgramGenerator(seed).program() for seed in range(10)]
+
+def run_with_sink(program, engine, sink):
+  it = Interpreter(console_output=False, input=['1', '2'], engine=engine, output_sink=sink)
+  return outcome(it, lambda: it.run(program))
+
+def written(tmp_path, program, engine, **options):
+  # the outcome of running program with an FdSink, and what the sink wrote
+  path = tmp_path / 'out'
+  fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+  try:
+    result = run_with_sink(program, engine, sinks.FdSink(fd, **options))
+  finally:
+    os.close(fd)
+  return result, path.read_text()
+
+@pytest.mark.parametrize('program', range(len(PROGRAMS)))
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('buffer_size', (1, 40, 1 << 16))
+def test_fd_sink_writes_every_line(tmp_path, program, engine, buffer_size):
+  expected = run_program(PROGRAMS[program], engine, ['1', '2'])
+  (lines, error, message), text = written(tmp_path, PROGRAMS[program], engine, buffer_size=buffer_size)
+  # an FdSink keeps nothing for get_output()
+  assert (lines, error, message) == ([], expected[1], expected[2])
+  assert text == ''.join(line + '\n' for line in expected[0])
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_fd_sink_flushes_when_the_run_fails(tmp_path, engine):
+  # nothing fills the buffer, so only run's final flush writes anything
+  (_, _, message), text = written(tmp_path, FAILS, engine)
+  assert message is not None
+  assert text == 'before\nstill before\n'
+
+def test_fd_sink_buffers_until_full(tmp_path):
+  path = tmp_path / 'out'
+  fd = os.open(path, os.O_WRONLY | os.O_CREAT)
+  try:
+    sink = sinks.FdSink(fd, buffer_size=10)
+    sink.write('abcd')
+    assert path.read_text() == ''
+    sink.write('efghi')
+    assert path.read_text() == 'abcd\nefghi\n'
+    sink.write(12)
+    sink.flush()
+    sink.flush()
+    assert path.read_text() == 'abcd\nefghi\n12\n'
+  finally:
+    os.close(fd)
+
+@pytest.mark.parametrize('program', range(len(PROGRAMS)))
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('maxlen', (1, 3, 1000))
+def test_ring_sink_keeps_the_last_lines(program, engine, maxlen):
+  expected = run_program(PROGRAMS[program], engine, ['1', '2'])
+  assert run_with_sink(PROGRAMS[program], engine, sinks.RingSink(maxlen)) == \
+         (expected[0][-maxlen:], expected[1], expected[2])
+
+def test_ring_sink_reset():
+  it = Interpreter(console_output=False, output_sink=sinks.RingSink(3))
+  it.run(COUNT)
+  assert it.get_output() == ['line 47', 'line 48', 'line 49']
+  it.reset()
+  assert it.get_output() == []
+
+@pytest.mark.parametrize('program', range(len(PROGRAMS)))
+@pytest.mark.parametrize('engine', ENGINES)
+def test_list_sink_matches_get_output(program, engine):
+  assert run_with_sink(PROGRAMS[program], engine, sinks.ListSink()) == run_program(PROGRAMS[program], engine, ['1', '2'])
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_callback_and_discard_sinks(engine):
+  lines = []
+  assert run_with_sink(COUNT, engine, sinks.CallbackSink(lines.append)) == ([], (None, None), None)
+  assert lines == run_program(COUNT, engine)[0]
+  assert run_with_sink(COUNT, engine, sinks.DiscardSink()) == ([], (None, None), None)
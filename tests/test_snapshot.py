@@ -0,0 +1,100 @@
+# Snapshots round trip: running a program up to its first input, snapshotting it and resuming
+# a restored copy must do exactly what one uninterrupted run does
+import pytest
+
+from interpreterv1 import Interpreter
+from program import Program
+from util import ENGINES, outcome, run_program
+import snapshot
+
+PROGRAMS = {
+  'setup_then_input': ['func square',
+                       '  assign result * x x',
+                       'endfunc',
+                       'func main',
+                       '  assign total 0',
+                       '  assign x 0',
+                       '  while < x 5',
+                       '    funccall square',
+                       '    assign total + total result',
+                       '    assign x + x 1',
+                       '  endwhile',
+                       '  funccall print "total " total',
+                       '  assign s "rope"',
+                       '  while < x 40',
+                       '    assign s + s "abcd"',
+                       '    assign x + x 1',
+                       '  endwhile',
+                       '  funccall input "n? "',
+                       '  funccall strtoint result',
+                       '  assign total + total result',
+                       '  funccall print total " " s',
+                       '  funccall input "m? "',
+                       '  funccall print result',
+                       'endfunc'],
+  # paused inside a call, an if and a while, which restore must rebuild
+  'input_in_blocks': ['func ask',
+                      '  if True',
+                      '    while < i 2',
+                      '      funccall input "q "',
+                      '      funccall print "got " result',
+                      '      assign i + i 1',
+                      '    endwhile',
+                      '  endif',
+                      'endfunc',
+                      'func main',
+                      '  assign i 0',
+                      '  funccall print "start"',
+                      '  funccall ask',
+                      '  funccall print "end " i',
+                      'endfunc'],
+  'no_input': ['func main', '  assign x 3', '  funccall print x', 'endfunc'],
+  'error_after_input': ['func main', '  funccall input "x "', '  funccall strtoint result', 'endfunc'],
+}
+INPUTS = ['12', '34']
+
+def forked(lines, engine, snapshot_options={}, restore_program=None, **options):
+  setup = Interpreter(console_output=False, engine=engine, **options)
+  snapshot.run_until_input(setup, lines)
+  data = snapshot.snapshot(setup, **snapshot_options)
+  fork = Interpreter(console_output=False, input=list(INPUTS), engine=engine)
+  snapshot.restore(fork, data, restore_program)
+  return outcome(fork, fork.resume)
+
+@pytest.mark.parametrize('name', sorted(PROGRAMS))
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('options', [{}, {'lazy': True}, {'compact': True}], ids=['plain', 'lazy', 'compact'])
+def test_round_trip(name, engine, options):
+  lines = PROGRAMS[name]
+  assert forked(lines, engine, **options) == run_program(lines, engine, INPUTS, **options)
+
+@pytest.mark.parametrize('name', sorted(PROGRAMS))
+def test_shared_program(name):
+  lines = PROGRAMS[name]
+  program = Program.load(lines)
+  expected = run_program(lines, input=INPUTS)
+  # many forks from one snapshot, all restoring into the same Program
+  setup = Interpreter(console_output=False)
+  assert snapshot.run_until_input(setup, program) == (name == 'no_input')
+  data = snapshot.snapshot(setup, include_program=False)
+  for _ in range(3):
+    fork = Interpreter(console_output=False, input=list(INPUTS))
+    snapshot.restore(fork, data, program)
+    assert fork.program is program
+    assert outcome(fork, fork.resume) == expected
+
+def test_snapshot_without_program_needs_one():
+  setup = Interpreter(console_output=False)
+  snapshot.run_until_input(setup, PROGRAMS['setup_then_input'])
+  data = snapshot.snapshot(setup, include_program=False)
+  with pytest.raises(ValueError):
+    snapshot.restore(Interpreter(console_output=False), data)
+
+def test_restore_rejects_other_programs_and_data():
+  setup = Interpreter(console_output=False)
+  snapshot.run_until_input(setup, PROGRAMS['setup_then_input'])
+  data = snapshot.snapshot(setup)
+  with pytest.raises(ValueError):
+    snapshot.restore(Interpreter(console_output=False), data, Program.load(PROGRAMS['no_input']))
+  with pytest.raises(ValueError):
+    snapshot.restore(Interpreter(console_output=False), b'not a snapshot')
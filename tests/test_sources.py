@@ -0,0 +1,94 @@
+# Input sources (sources.py) must give a program the same lines, and the same None at the end
+# of input, as passing those lines as an input list does
+import io
+
+import pytest
+
+from interpreterv1 import Interpreter
+from util import ENGINES, outcome, run_program
+import sources
+
+# reads past the end of every input below, printing each line (None once it runs out)
+ECHO = ['func main',
+        '  assign n 0',
+        '  while < n 8',
+        '    funccall input "? "',
+        '    funccall print n ": [" result "]"',
+        '    assign n + n 1',
+        '  endwhile',
+        'endfunc']
+
+TEXTS = {
+  'lf': 'one\ntwo\nthree\n',
+  'crlf': 'one\r\ntwo\r\nthree\r\n',
+  'no_trailing_newline': 'one\ntwo\nthree',
+  'crlf_no_trailing_newline': 'one\r\ntwo\r\nthree',
+  'blank_lines': '\none\n\n\ntwo\n\n',
+  'empty': '',
+  'only_newline': '\n',
+  'unicode': 'café\r\n☃\n',
+}
+
+def expected_lines(text):
+  # the input list text stands for
+  lines = text.replace('\r\n', '\n').split('\n')
+  return lines[:-1] if text.endswith('\n') or not text else lines
+
+SOURCES = {
+  'file_path': lambda path: sources.FileSource(str(path)),
+  'file_object': lambda path: sources.FileSource(open(path, encoding='utf-8', newline=None)),
+  'file_small_buffer': lambda path: sources.FileSource(str(path), buffer_size=2),
+  'mmap': lambda path: sources.MmapSource(str(path)),
+}
+
+def source_for(tmp_path, name, text):
+  path = tmp_path / 'input.txt'
+  path.write_bytes(text.encode('utf-8'))
+  return SOURCES[name](path)
+
+def read_all(source):
+  return list(iter(source.read, None))
+
+@pytest.mark.parametrize('text', sorted(TEXTS))
+@pytest.mark.parametrize('name', sorted(SOURCES))
+def test_source_reads_lines(tmp_path, text, name):
+  source = source_for(tmp_path, name, TEXTS[text])
+  try:
+    assert read_all(source) == expected_lines(TEXTS[text])
+    # and stays at the end of input
+    assert source.read() is None
+    assert source.read() is None
+  finally:
+    source.close()
+
+@pytest.mark.parametrize('text', sorted(TEXTS))
+@pytest.mark.parametrize('name', sorted(SOURCES))
+@pytest.mark.parametrize('engine', ENGINES)
+def test_source_matches_input_list(tmp_path, text, name, engine):
+  with source_for(tmp_path, name, TEXTS[text]) as source:
+    it = Interpreter(console_output=False, engine=engine, input_source=source)
+    # an empty input list means reading the keyboard instead
+    lines = expected_lines(TEXTS[text])
+    expected = run_program(ECHO, engine, lines) if lines else run_program(ECHO, engine, input_source=sources.IterSource([]))
+    assert outcome(it, lambda: it.run(ECHO)) == expected
+
+@pytest.mark.parametrize('name', sorted(SOURCES))
+def test_reset_rewinds(tmp_path, name):
+  with source_for(tmp_path, name, TEXTS['crlf']) as source:
+    it = Interpreter(console_output=False, input_source=source)
+    it.run(ECHO)
+    first = list(it.get_output())
+    it.reset()
+    it.run(ECHO)
+    assert it.get_output() == first
+
+def test_file_source_leaves_given_files_open():
+  file = io.StringIO('a\nb\n')
+  with sources.FileSource(file) as source:
+    assert read_all(source) == ['a', 'b']
+  assert not file.closed
+
+def test_iter_source():
+  source = sources.IterSource(line for line in ['a', '', 'b'])
+  assert read_all(source) == ['a', '', 'b']
+  assert source.read() is None
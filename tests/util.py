@@ -0,0 +1,122 @@
+# Helpers shared by the tests: running programs and recording what they did, and generating
+# random (but always terminating) programs for differential testing of the engines
+import random
+
+from interpreterv1 import Interpreter
+
+ENGINES = (Interpreter.REFERENCE_ENGINE, Interpreter.VM_ENGINE, Interpreter.PYTHON_ENGINE)
+
+def outcome(it, run):
+  # what calling run did on interpreter it: (output, (error type, error line), exception message)
+  try:
+    run()
+    message = None
+  except Exception as e:
+    message = str(e)
+  return list(it.get_output()), it.get_error_type_and_line(), message
+
+def run_program(program, engine=Interpreter.REFERENCE_ENGINE, input=(), max_steps=None, **options):
+  it = Interpreter(console_output=False, input=list(input), engine=engine, **options)
+  return outcome(it, lambda: it.run(program, max_steps))
+
+INTS = ('a', 'b', 'c')
+STRS = ('s', 't')
+BOOLS = ('p', 'q')
+KINDS = ('int', 'str', 'bool')
+
+class ProgramGenerator:
+  # builds programs from functions f0, f1, ... and main, each calling only functions defined
+  # before it and looping a bounded number of times. A few operands have the wrong type or name
+  # a variable that is never assigned, so some programs fail part way through
+  def __init__(self, seed, functions=3, error_rate=0.01):
+    self.rng = random.Random(seed)
+    self.functions = functions
+    self.error_rate = error_rate
+    self.counters = 0
+    self.lines = []
+
+  def program(self):
+    for f in range(self.functions):
+      self.function(f'f{f}', f)
+    self.lines.append('func main')
+    for name in INTS:
+      self.lines.append(f'  assign {name} {self.rng.randint(-5, 9)}')
+    for name in STRS:
+      self.lines.append(f'  assign {name} "{self.rng.choice("xyz")}"')
+    for name in BOOLS:
+      self.lines.append(f'  assign {name} {self.rng.choice(("True", "False"))}')
+    self.block(1, 2, self.functions)
+    for name in INTS + STRS + BOOLS:
+      self.lines.append(f'  funccall print {name}')
+    self.lines.append('endfunc')
+    return self.lines
+
+  def function(self, name, callable_count):
+    self.lines.append(f'func {name}')
+    self.block(1, 2, callable_count)
+    if self.rng.random() < 0.5:
+      self.lines.append(f'  return {self.expression(self.rng.choice(KINDS), 1)}')
+    self.lines.append('endfunc')
+
+  def block(self, depth, nesting, callable_count):
+    pad = '  ' * depth
+    for _ in range(self.rng.randint(1, 4)):
+      choice = self.rng.random()
+      if choice < 0.35:
+        kind = self.rng.choice(KINDS)
+        name = self.rng.choice({'int': INTS, 'str': STRS, 'bool': BOOLS}[kind])
+        self.lines.append(f'{pad}assign {name} {self.expression(kind, 2)}')
+      elif choice < 0.5:
+        self.lines.append(f'{pad}funccall print {self.operand(self.rng.choice(KINDS))} {self.operand(self.rng.choice(KINDS))}')
+      elif choice < 0.6 and callable_count:
+        self.lines.append(f'{pad}funccall f{self.rng.randrange(callable_count)}')
+        self.lines.append(f'{pad}funccall print result')
+      elif choice < 0.65:
+        self.lines.append(f'{pad}funccall strtoint {self.rng.choice(("s", "42", "-7"))}')
+      elif choice < 0.8 and nesting:
+        self.lines.append(f'{pad}if {self.expression("bool", 2)}')
+        self.block(depth+1, nesting-1, callable_count)
+        if self.rng.random() < 0.5:
+          self.lines.append(f'{pad}else')
+          self.block(depth+1, nesting-1, callable_count)
+        self.lines.append(f'{pad}endif')
+      elif nesting:
+        counter = f'w{self.counters}'
+        self.counters += 1
+        self.lines.append(f'{pad}assign {counter} 0')
+        self.lines.append(f'{pad}while < {counter} {self.rng.randint(0, 3)}')
+        self.block(depth+1, nesting-1, callable_count)
+        self.lines.append(f'{pad}  assign {counter} + {counter} 1')
+        self.lines.append(f'{pad}endwhile')
+      if self.rng.random() < 0.1:
+        self.lines.append('')
+      if self.rng.random() < 0.1:
+        self.lines.append(f'{pad}# comment')
+
+  def expression(self, kind, depth):
+    rng = self.rng
+    if depth == 0 or rng.random() < 0.4:
+      return self.operand(kind)
+    if kind == 'int':
+      return f'{rng.choice("+-*/%")} {self.expression("int", depth-1)} {self.divisor()}'
+    if kind == 'str':
+      return f'+ {self.expression("str", depth-1)} {self.expression("str", depth-1)}'
+    if rng.random() < 0.3:
+      return f'{rng.choice("&|")} {self.expression("bool", depth-1)} {self.expression("bool", depth-1)}'
+    compared = rng.choice(KINDS)
+    ops = ('==', '!=') if compared == 'bool' else ('<', '>', '<=', '>=', '==', '!=')
+    return f'{rng.choice(ops)} {self.expression(compared, depth-1)} {self.expression(compared, depth-1)}'
+
+  def divisor(self):
+    # never a literal zero, though variables can still be zero
+    return self.operand('int') if self.rng.random() < 0.5 else str(self.rng.randint(1, 9))
+
+  def operand(self, kind):
+    rng = self.rng
+    if rng.random() < self.error_rate:
+      return rng.choice(('zz', '"oops"', 'True', '3'))
+    if kind == 'int':
+      return rng.choice(INTS) if rng.random() < 0.6 else str(rng.randint(-9, 9))
+    if kind == 'str':
+      return rng.choice(STRS) if rng.random() < 0.6 else f'"{rng.choice(("ab", "c", "xyz"))}"'
+    return rng.choice(BOOLS) if rng.random() < 0.6 else rng.choice(('True', 'False'))
@@ -0,0 +1,392 @@
+# Python engine: translates a Brewin program into Python source and compiles it with compile(),
+# so it runs as native Python without any per statement dispatch. Brewin functions become Python
+# functions, if and while become Python if and while, and prefix expressions become Python
+# expressions over variables kept in the generated module's globals (v<slot>, absent until
+# assigned). Output, errors and error lines match the reference engine (Interpreter.__interpret):
+#   - binary operators take a fast path when both operands have a type on which the Python
+#     operator agrees with Brewin, anything else goes through operator_for and Interpreter.compute
+#   - helpers raising errors take the Brewin line from the generated line calling them, and
+#     reading an unassigned variable is a NameError, which run reports the same way
+#   - a tail call returns the function to call next instead of calling it, and each call site
+#     runs the resulting chain in a loop, so tail recursion takes no stack as in the other engines
+# Only programs whose block structure is regular are translated (see _irregularity), since those
+# are the programs that behave like the structured code they look like. Others run on the
+# reference engine, as do runs with a step limit or trace_output, and step. Recursing deeper than
+# RECURSION_LIMIT calls raises RecursionLimitExceeded, which the other engines never raise
+import sys
+import threading
+
+from intbase import InterpreterBase, ErrorType, RecursionLimitExceeded
+from expression import OPERATORS, NUMBER_REGEX, STRING_REGEX, OPERATOR_TABLE, UNSET, RESULT_SLOT, operator_for
+from rope import Rope, flatten
+import checker
+import lexer
+
+FILENAME = '<brewin>'
+# Brewin recursion is only bounded by memory, Python's by the recursion limit
+RECURSION_LIMIT = 1 << 20
+# the recursion limit is process wide, so it's raised while any run is active and
+# only restored once the last one finishes, whichever thread each run is on
+_limit_lock = threading.Lock()
+_limit_users = 0
+_saved_limit = None
+
+# Python operator for each Brewin operator, and the operand types (both operands having the
+# same one) it gives Brewin's result for. None stands for any type but Rope
+FAST_PATHS = {'+': ('+', (int,)), '-': ('-', (int,)), '*': ('*', (int,)), '/': ('//', (int,)), '%': ('%', (int,)),
+              '<': ('<', (int, str)), '>': ('>', (int, str)), '<=': ('<=', (int, str)), '>=': ('>=', (int, str)),
+              '==': ('==', None), '!=': ('!=', None), '&': ('and', (bool,)), '|': ('or', (bool,))}
+
+class Translation:
+  def __init__(self, code=None, lines=None, reason=None):
+    self.code = code # compiled module defining f<line> for each function, None if not translated
+    self.lines = lines # Brewin line of each generated line, indexed by Python line number
+    self.reason = reason # why the program wasn't translated
+
+# raised when a main function finishes, which ends the program
+class _Exit(Exception):
+  pass
+
+# raised for programs the translation doesn't cover
+class _Untranslatable(Exception):
+  pass
+
+def translate(program):
+  # lazily loaded functions need all their tokens
+  for start in list(program.pending):
+    program.load_function(start)
+  translator = _Translator(program)
+  try:
+    reason = translator.irregularity()
+    if reason is not None:
+      return Translation(reason=reason)
+    for name, line in program.functions.items():
+      translator.function(line)
+    code = compile('\n'.join(translator.out) + '\n', FILENAME, 'exec')
+  except _Untranslatable as e:
+    return Translation(reason=str(e))
+  except (SyntaxError, RecursionError, MemoryError) as e:
+    # such as blocks nested deeper than Python allows
+    return Translation(reason=f"generated code does not compile: {e}")
+  return Translation(code, translator.lines)
+
+class _Translator:
+  def __init__(self, program):
+    self.program = program
+    self.tokens = program.tokenized_lines
+    self.slots = program.slots
+    self.kinds = [lexer.block_kind(line, tokens) for line, tokens in zip(program.lines, self.tokens)]
+    self.out = [] # generated lines
+    self.lines = [None] # Python numbers lines from 1
+    self.temps = 0
+
+  def irregularity(self):
+    # why the program can't be translated, or None if it can
+    program = self.program
+    if not program.main_lines:
+      return "no main function"
+    enclosing = checker.enclosing_blocks(program)
+    if enclosing is None:
+      return "irregular block structure"
+    for i, kind in enumerate(self.kinds):
+      if kind in lexer.OPENERS and i not in program.jumps:
+        return f"block on line {i} is never closed"
+    # the else lines of each if, in order
+    self.elses = {}
+    for i, kind in enumerate(self.kinds):
+      if kind == InterpreterBase.ELSE_DEF:
+        self.elses.setdefault(enclosing[i], []).append(i)
+    return None
+
+  def emit(self, depth, text, line):
+    self.out.append('  ' * depth + text)
+    self.lines.append(line)
+
+  def temp(self):
+    self.temps += 1
+    return f"_t{self.temps}"
+
+  def function(self, start):
+    end = self.program.jumps[start]
+    self.main = self.tokens[start][1] == "main"
+    self.assigned = set()
+    # what ending the function does, at its endfunc and on return
+    if end in self.program.static_errors:
+      self.leave = f"_static({end})"
+    elif self.main:
+      self.leave = "raise _Exit"
+    else:
+      self.leave = "return"
+    self.emit(0, f"def f{start}():", start)
+    declaration = len(self.out)
+    self.emit(1, "pass", start)
+    self.block(start+1, end, 1)
+    self.emit(1, self.leave, end)
+    if self.assigned:
+      self.out[declaration] = '  global ' + ', '.join(f"v{slot}" for slot in sorted(self.assigned))
+
+  def block(self, i, end, depth):
+    emitted = len(self.out)
+    while i < end:
+      i = self.statement(i, depth)
+    if len(self.out) == emitted:
+      self.emit(depth, "pass", end)
+
+  def statement(self, i, depth):
+    # emits line i, returning the line after it (after the whole block for if and while)
+    tokens = self.tokens[i]
+    if not tokens:
+      return i+1
+    token = tokens[0]
+    if i in self.program.static_errors:
+      self.emit(depth, f"_static({i})", i)
+      # nothing after the error runs, including the rest of a block it opens
+      if self.kinds[i] == InterpreterBase.IF_DEF:
+        return self.program.jumps[self.elses.get(i, [i])[-1]] + 1
+      if self.kinds[i] == InterpreterBase.WHILE_DEF:
+        return self.program.jumps[i] + 1
+      return i+1
+
+    if token == InterpreterBase.IF_DEF:
+      return self.if_statement(i, tokens, depth)
+    if token == InterpreterBase.WHILE_DEF:
+      return self.while_statement(i, tokens, depth)
+    if token == InterpreterBase.FUNCCALL_DEF:
+      if tokens[1] in lexer.BUILTINS:
+        self.builtin(i, tokens[1], tokens, depth)
+      else:
+        self.call(i, tokens[1], depth)
+    elif token in lexer.BUILTINS:
+      self.builtin(i, token, tokens, depth)
+    elif token == InterpreterBase.ASSIGN_DEF:
+      value = self.operand(tokens[2])[0] if len(tokens) == 3 else self.expression(tokens[2:])
+      self.assign(i, self.slots[tokens[1]], value, depth)
+    elif token == InterpreterBase.RETURN_DEF:
+      if len(tokens) >= 2:
+        self.assign(i, RESULT_SLOT, self.expression(tokens[1:]), depth)
+      self.emit(depth, self.leave, i)
+    else:
+      # statements the interpreter doesn't know leave ip where it is, so it runs them forever
+      self.emit(depth, "while True: pass", i)
+    return i+1
+
+  def if_statement(self, i, tokens, depth):
+    elses = self.elses.get(i, [])
+    endif = self.program.jumps[elses[-1] if elses else i]
+    self.emit(depth, f"if {self.condition(i, tokens, 'if', depth)}:", i)
+    self.block(i+1, elses[0] if elses else endif, depth+1)
+    if elses:
+      # after the if branch, the first else is run before jumping to endif
+      self.static_error(elses[0], depth+1)
+      self.emit(depth, "else:", elses[0])
+      # without it, every else is run in turn, so their branches run one after the other
+      for k, line in enumerate(elses):
+        self.static_error(line, depth+1)
+        self.block(line+1, elses[k+1] if k+1 < len(elses) else endif, depth+1)
+    self.static_error(endif, depth)
+    return endif+1
+
+  def while_statement(self, i, tokens, depth):
+    endwhile = self.program.jumps[i]
+    self.emit(depth, "while True:", i)
+    self.emit(depth+1, f"if not ({self.condition(i, tokens, 'while', depth+1)}): break", i)
+    self.block(i+1, endwhile, depth+1)
+    self.static_error(endwhile, depth+1)
+    return endwhile+1
+
+  def static_error(self, i, depth):
+    if i in self.program.static_errors:
+      self.emit(depth, f"_static({i})", i)
+
+  def condition(self, i, tokens, kind, depth):
+    # like Interpreter.process_if, == True or == False decides, anything else is an error
+    self.emit(depth, f"_c = {self.expression(tokens[1:])}", i)
+    return f"_c is True or _c is not False and _truth(_c, {kind!r})"
+
+  def call(self, i, name, depth):
+    loc = self.program.functions[name]
+    # main ends the program when it returns, so its tail calls must come back to it
+    if i in self.program.tail_calls and not self.main:
+      self.emit(depth, f"return f{loc}", i)
+      return
+    self.emit(depth, f"_f = f{loc}", i)
+    self.emit(depth, "while _f is not None: _f = _f()", i)
+
+  def builtin(self, i, name, tokens, depth):
+    if name == InterpreterBase.STRTOINT_DEF:
+      num_str = tokens[2]
+      slot = self.slots.get(num_str)
+      value = f"_g.get('v{slot}', _UNSET)" if slot is not None else "_UNSET"
+      literal = int(num_str) if NUMBER_REGEX.match(num_str) else None
+      self.assign(i, RESULT_SLOT, f"_strtoint({value}, {num_str!r}, {literal!r})", depth)
+    elif name == InterpreterBase.INPUT_DEF:
+      self.assign(i, RESULT_SLOT, f"_input({self.joined(tokens[2:])})", depth)
+    else:
+      self.emit(depth, f"_output({self.joined(tokens[2:])})", i)
+
+  def joined(self, tokens):
+    # the arguments of print or input concatenated, as in Interpreter.process_print
+    operands = [self.operand(token) for token in tokens]
+    if all(value is not UNSET for source, value in operands):
+      return repr(''.join(str(value) for source, value in operands))
+    parts = [repr(str(value)) if value is not UNSET else f"str({source})" for source, value in operands]
+    return parts[0] if len(parts) == 1 else f"''.join(({', '.join(parts)},))"
+
+  def assign(self, i, slot, value, depth):
+    self.assigned.add(slot)
+    self.emit(depth, f"v{slot} = {value}", i)
+
+  def operand(self, v):
+    # (Python source, value if known now or UNSET) of an operand, as expression.compile_operand
+    if NUMBER_REGEX.match(v):
+      return repr(int(v)), int(v)
+    if STRING_REGEX.match(v):
+      return repr(v[1:-1]), v[1:-1]
+    slot = self.slots.get(v)
+    if v == InterpreterBase.TRUE_DEF or v == InterpreterBase.FALSE_DEF:
+      literal = v == InterpreterBase.TRUE_DEF
+      if slot is None:
+        return repr(literal), literal
+      return f"_g.get('v{slot}', {literal!r})", UNSET
+    if slot is None:
+      return f"_undefined({v!r})", UNSET
+    return f"v{slot}", UNSET
+
+  def expression(self, tokens):
+    # operators pair up with operands as in expression.compile_expression
+    operators = [token for token in tokens if token in OPERATORS]
+    operands = [self.operand(token) for token in tokens if token not in OPERATORS]
+    if len(operands) != len(operators) + 1:
+      raise _Untranslatable("malformed expression")
+    node = operands[-1]
+    for i in range(len(operators)-1, -1, -1):
+      node = self.binary(operators[i], operands[i], node)
+    return node[0]
+
+  def binary(self, op, left, right):
+    a = left[1]
+    b = right[1]
+    if (self.program.optimize and a is not UNSET and b is not UNSET and type(a) is type(b) and
+        (op, type(a)) in OPERATOR_TABLE and not (op in ('/', '%') and b == 0)):
+      value = flatten(OPERATOR_TABLE[op, type(a)](a, b))
+      return repr(value), value
+
+    python_op, types = FAST_PATHS[op]
+    # the fast path needs both operands of one type it covers, a literal fixes that type up front
+    known = type(a) if a is not UNSET else type(b) if b is not UNSET else None
+    if known is not None and types is not None and known not in types or a is not UNSET and b is not UNSET:
+      return f"_binary({op!r}, {left[0]}, {right[0]})", UNSET
+    x = left[0] if a is not UNSET else self.temp()
+    y = right[0] if b is not UNSET else self.temp()
+    if known is not None:
+      guard = f"type({y} := {right[0]}) is {known.__name__}" if a is not UNSET else f"type({x} := {left[0]}) is {known.__name__}"
+    else:
+      tail = "is not _Rope" if types is None else f"is {types[0].__name__}" if len(types) == 1 else "in _ORDERED"
+      guard = f"type({x} := {left[0]}) is type({y} := {right[0]}) {tail}"
+    return f"({x} {python_op} {y} if {guard} else _binary({op!r}, {x}, {y}))", UNSET
+
+def run(it, translation):
+  # runs the translated program on interpreter it, set up by Interpreter.start
+  program = it.program
+  lines = translation.lines
+
+  def fail(error_type, description):
+    # called by helpers, which are called by generated code
+    it.ip_ = lines[sys._getframe(2).f_lineno]
+    it.error(error_type, description=description, line_num=it.ip_)
+
+  def static(i):
+    it.ip_ = i
+    error_type, description = program.static_errors[i]
+    it.error(error_type, description=description, line_num=i)
+
+  def undefined(v):
+    fail(ErrorType.NAME_ERROR, f"variable {v} is not defined")
+
+  def truth(value, kind):
+    if value == True:
+      return True
+    if value == False:
+      return False
+    fail(ErrorType.TYPE_ERROR, f"expression following {kind} statement must evaluate to boolean")
+
+  def binary(op, a, b):
+    func = operator_for(op, type(a), type(b))
+    if func is None:
+      # compute raises the right type error
+      it.ip_ = lines[sys._getframe(1).f_lineno]
+      return it.compute(op, a, b)
+    return func(a, b)
+
+  def strtoint(value, num_str, literal):
+    value = flatten(value)
+    if value is not UNSET:
+      if isinstance(value, str) and NUMBER_REGEX.match(value):
+        return int(value)
+      fail(ErrorType.TYPE_ERROR, f"variable {num_str} references value {value} which does not convert to a valid integer")
+    if literal is None:
+      fail(ErrorType.TYPE_ERROR, f"string to convert must be valid variable or represent valid integer")
+    return literal
+
+  def read_input(prompt):
+    it.output(prompt)
+    return it.get_input()
+
+  namespace = {'_Exit': _Exit, '_UNSET': UNSET, '_Rope': Rope, '_ORDERED': (int, str), '_static': static,
+               '_undefined': undefined, '_truth': truth, '_binary': binary, '_strtoint': strtoint,
+               '_input': read_input, '_output': it.output}
+  namespace['_g'] = namespace
+  exec(translation.code, namespace)
+
+  _raise_recursion_limit()
+  unassigned = None
+  try:
+    func = namespace[f"f{program.functions['main']}"]
+    while func is not None:
+      func = func()
+  except _Exit:
+    pass
+  except RecursionError:
+    raise RecursionLimitExceeded(f"program recursed deeper than the python engine's limit of {RECURSION_LIMIT} calls") from None
+  except NameError as e:
+    unassigned = _unassigned_variable(e, program, lines)
+    if unassigned is None:
+      raise
+  finally:
+    _restore_recursion_limit()
+    # so Interpreter.variables sees the final values
+    for slot in range(len(it.values)):
+      it.values[slot] = namespace.get(f"v{slot}", UNSET)
+  if unassigned is not None:
+    name, it.ip_ = unassigned
+    it.error(ErrorType.NAME_ERROR, description=f"variable {name} is not defined", line_num=it.ip_)
+  it.terminated = True
+
+def _raise_recursion_limit():
+  global _limit_users, _saved_limit
+  with _limit_lock:
+    if _limit_users == 0:
+      _saved_limit = sys.getrecursionlimit()
+      sys.setrecursionlimit(max(_saved_limit, RECURSION_LIMIT))
+    _limit_users += 1
+
+def _restore_recursion_limit():
+  global _limit_users
+  with _limit_lock:
+    _limit_users -= 1
+    if _limit_users == 0:
+      sys.setrecursionlimit(_saved_limit)
+
+def _unassigned_variable(error, program, lines):
+  # (name, line) of the variable generated code read before it was assigned, None for other NameErrors
+  slot = error.name[1:] if error.name and error.name[0] == 'v' else ''
+  if not slot.isdigit():
+    return None
+  line = None
+  tb = error.__traceback__
+  while tb is not None:
+    if tb.tb_frame.f_code.co_filename == FILENAME:
+      line = lines[tb.tb_lineno]
+    tb = tb.tb_next
+  names = {slot: name for name, slot in program.slots.items()}
+  return names[int(slot)], line
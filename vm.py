@@ -0,0 +1,290 @@
+# Bytecode engine for the interpreter: compiles tokenized lines into an instruction array
+# with integer opcodes, pre-resolved operands and jump targets, then runs it from a
+# dispatch table. Output, errors and error lines match the reference engine (Interpreter.__interpret)
+from intbase import InterpreterBase, ErrorType, StepLimitExceeded
+from expression import compile_operand, compile_expression, constant_of, NUMBER_REGEX, UNSET, RESULT_SLOT
+from frames import IfBlock, WhileBlock, CallFrame
+from lexer import BUILTINS
+from rope import flatten
+
+# opcodes, which double as indices into HANDLERS
+NOP, SPIN, RAISE, FUNC, FUNCCALL, CALL, RETURN, ENDFUNC, STRTOINT, INPUT, PRINT, IF, ELSE, ENDIF, WHILE, ENDWHILE, ASSIGN, TAILCALL, IF_TAKEN, IF_SKIPPED, LOAD = range(21)
+
+# every instruction is a tuple (opcode, next ip, operands...) with one instruction per source line,
+# so ip and error line numbers stay the same as in the reference engine.
+# Runs that count statements (with a step limit, step or trace_output) use counted code, which
+# runs every line the reference engine runs, blank lines and the func line of each call included,
+# so steps and step limits mean the same on every engine. Other runs skip straight past those lines
+OP_IDX = 0
+NEXT_IDX = 1
+
+def skip_blank_lines(lines):
+  # fall through (and jump) past blank lines directly to the next statement
+  skip = [len(lines)] * (len(lines)+1)
+  for i in range(len(lines)-1, -1, -1):
+    skip[i] = i if lines[i] else skip[i+1]
+  return skip
+
+# counted code is compiled with skip going to every next line, see bytecode in program.py
+def compile_program(program, skip, counted=False):
+  if not program.pending:
+    return [compile_line(program, i, skip, counted) for i in range(len(program.tokenized_lines))]
+  # lines of lazily loaded functions get a placeholder that loads the function the first time any of it runs
+  owners = program.owners
+  return [(LOAD, skip[i+1], owners[i]) if owners[i] in program.pending else compile_line(program, i, skip, counted)
+          for i in range(len(program.tokenized_lines))]
+
+def compile_line(program, i, skip, counted=False):
+  tokens = program.tokenized_lines[i]
+  nxt = skip[i+1]
+  if not tokens:
+    return (NOP, nxt)
+
+  # lines with errors found at load time raise them when run, see checker.py
+  error = program.static_errors.get(i)
+  ins = _raise(error[0], error[1], i) if error is not None else _compile_statement(program, tokens, i, skip, nxt, counted)
+  # the few calls whose alignment depends on the block stack check it first
+  if i in program.dynamic_calls:
+    return (FUNCCALL, nxt, program.indents[i], ins)
+  return ins
+
+def _compile_statement(program, tokens, i, skip, nxt, counted):
+  token = tokens[0]
+  if token == InterpreterBase.FUNC_DEF:
+    return (FUNC, nxt)
+  if token == InterpreterBase.FUNCCALL_DEF:
+    return _compile_call(program, tokens, i, skip, counted)
+  if token == InterpreterBase.RETURN_DEF:
+    return (RETURN, nxt, compile_expression(tokens[1:], program.slots, program.optimize) if len(tokens) >= 2 else None)
+  if token == InterpreterBase.ENDFUNC_DEF:
+    return (ENDFUNC, nxt, program.indents[i])
+  if token in BUILTINS:
+    return _compile_builtin(program, token, tokens, i, nxt)
+  if token == InterpreterBase.IF_DEF:
+    expr = compile_expression(tokens[1:], program.slots, program.optimize)
+    # an if whose condition is known up front just jumps, though it still opens a block for its else and endif
+    value = constant_of(expr)
+    if value is not UNSET and value == True:
+      return (IF_TAKEN, nxt, program.indents[i])
+    if value is not UNSET and value == False:
+      return (IF_SKIPPED, nxt, program.indents[i], program.jumps.get(i))
+    return (IF, nxt, program.indents[i], expr, program.jumps.get(i))
+  if token == InterpreterBase.ELSE_DEF:
+    return (ELSE, nxt, program.jumps.get(i))
+  if token == InterpreterBase.ENDIF_DEF:
+    return (ENDIF, nxt, program.indents[i])
+  if token == InterpreterBase.WHILE_DEF:
+    # unclosed blocks get no target, just as the reference engine only fails once program needs one
+    endwhile = program.jumps.get(i)
+    return (WHILE, nxt, program.indents[i], compile_expression(tokens[1:], program.slots, program.optimize), skip[endwhile+1] if endwhile is not None else None)
+  if token == InterpreterBase.ENDWHILE_DEF:
+    return (ENDWHILE, nxt, program.indents[i])
+  if token == InterpreterBase.ASSIGN_DEF:
+    expr = compile_operand(tokens[2], program.slots) if len(tokens) == 3 else compile_expression(tokens[2:], program.slots, program.optimize)
+    return (ASSIGN, nxt, program.slots[tokens[1]], expr)
+
+  # the reference engine neither executes nor skips unknown statements
+  return (SPIN, nxt)
+
+def _compile_call(program, tokens, i, skip, counted):
+  func_name = tokens[1]
+  if func_name in BUILTINS:
+    return _compile_builtin(program, func_name, tokens, i, skip[i+1])
+  loc = program.functions[func_name]
+  # enter the callee at its first statement rather than its func line, unless counting its func line
+  entry = loc if counted else skip[loc+1]
+  if i in program.tail_calls:
+    return (TAILCALL, skip[i+1], func_name, entry, program.indents[loc], program.indents[program.tail_calls[i]])
+  return (CALL, skip[i+1], func_name, entry, program.indents[loc])
+
+def _compile_builtin(program, name, tokens, i, nxt):
+  if name == InterpreterBase.STRTOINT_DEF:
+    # numeric tokens can never name a variable, so they convert up front
+    num_str = tokens[2]
+    return (STRTOINT, nxt, num_str, program.slots.get(num_str), int(num_str) if NUMBER_REGEX.match(num_str) else None)
+  operands = tuple(compile_operand(token, program.slots) for token in tokens[2:])
+  return (INPUT if name == InterpreterBase.INPUT_DEF else PRINT, nxt, operands)
+
+def _raise(error_type, description, i):
+  return (RAISE, i+1, error_type, description, i)
+
+def execute(it, max_steps=None):
+  code = it.code = it.program.bytecode(max_steps is not None)
+  handlers = HANDLERS
+  if max_steps is None:
+    while not it.terminated:
+      ins = code[it.ip_]
+      handlers[ins[OP_IDX]](it, ins)
+    return
+
+  while it.steps < max_steps:
+    if it.terminated:
+      return
+    ins = code[it.ip_]
+    handlers[ins[OP_IDX]](it, ins)
+    it.steps += 1
+  if not it.terminated:
+    raise StepLimitExceeded(f"program did not finish within {max_steps} steps")
+
+def execute_slice(it, n, stop_before=()):
+  # Interpreter.step for the vm engine
+  code = it.code = it.program.bytecode(True)
+  handlers = HANDLERS
+  done = 0
+  try:
+    while done < n and not it.terminated:
+      if done and it.ip_ in stop_before:
+        break
+      ins = code[it.ip_]
+      handlers[ins[OP_IDX]](it, ins)
+      done += 1
+  finally:
+    it.steps += done
+  return it.terminated
+
+def step(it):
+  # executes a single instruction, of code set up by the caller
+  ins = it.code[it.ip_]
+  HANDLERS[ins[OP_IDX]](it, ins)
+
+def _nop(it, ins):
+  it.ip_ = ins[NEXT_IDX]
+
+def _spin(it, ins):
+  pass
+
+def _raise_error(it, ins):
+  it.error(ins[2], description=ins[3], line_num=ins[4])
+
+def _funccall(it, ins):
+  # check that indent is greater than outer block
+  if not it.block_stk or it.block_stk[-1].indent >= ins[2]:
+    it.error(ErrorType.SYNTAX_ERROR, description="misaligned funccall statement", line_num=it.ip_)
+  inner = ins[3]
+  HANDLERS[inner[OP_IDX]](it, inner)
+
+def _call(it, ins):
+  it.block_stk.append(CallFrame(ins[4], ins[2], ins[NEXT_IDX], ins[2] == "main"))
+  it.ip_ = ins[3]
+
+def _tailcall(it, ins):
+  # reuse the caller's frame when its endfunc (indent ins[5]) would have found it on top, see Interpreter.process_funccall
+  top = it.block_stk[-1]
+  if top.kind != InterpreterBase.FUNCCALL_DEF or top.indent != ins[5]:
+    _call(it, ins)
+    return
+  it.block_stk[-1] = CallFrame(ins[4], ins[2], top.after_ip, top.main or ins[2] == "main")
+  it.ip_ = ins[3]
+
+def _return(it, ins):
+  if ins[2] is not None:
+    it.values[RESULT_SLOT] = ins[2](it)
+  block_stk = it.block_stk
+  while block_stk and block_stk[-1].kind != InterpreterBase.FUNCCALL_DEF:
+    block_stk.pop()
+  it.ip_ = it.jumps[it.functions[block_stk[-1].name]]
+
+def _endfunc(it, ins):
+  block_stk = it.block_stk
+  if not block_stk or block_stk[-1].kind != InterpreterBase.FUNCCALL_DEF or block_stk[-1].indent != ins[2]:
+    it.error(ErrorType.SYNTAX_ERROR, description="mismatched endfunc statement")
+  frame = block_stk.pop()
+  if frame.main:
+    it.terminated = True
+  it.ip_ = frame.after_ip
+
+def _strtoint(it, ins):
+  num_str = ins[2]
+  value = flatten(it.values[ins[3]]) if ins[3] is not None else UNSET
+  if value is not UNSET:
+    if isinstance(value, str) and NUMBER_REGEX.match(value):
+      it.values[RESULT_SLOT] = int(value)
+    else:
+      it.error(ErrorType.TYPE_ERROR, description=f"variable {num_str} references value {value} which does not convert to a valid integer", line_num=it.ip_)
+  elif ins[4] is not None:
+    it.values[RESULT_SLOT] = ins[4]
+  else:
+    it.error(ErrorType.TYPE_ERROR, description=f"string to convert must be valid variable or represent valid integer", line_num=it.ip_)
+  it.ip_ = ins[NEXT_IDX]
+
+def _input(it, ins):
+  prompt_str = "".join([str(operand(it)) for operand in ins[2]])
+  it.output(prompt_str)
+  it.values[RESULT_SLOT] = it.get_input()
+  it.ip_ = ins[NEXT_IDX]
+
+def _print(it, ins):
+  res_str = "".join([str(operand(it)) for operand in ins[2]])
+  it.output(res_str)
+  it.ip_ = ins[NEXT_IDX]
+
+def _if(it, ins):
+  expr_res = ins[3](it)
+  if expr_res == True:
+    it.block_stk.append(IfBlock(ins[2], True))
+    it.ip_ = ins[NEXT_IDX]
+  elif expr_res == False:
+    it.block_stk.append(IfBlock(ins[2], False))
+    it.ip_ = ins[4]
+  else:
+    it.error(ErrorType.TYPE_ERROR, description=f"expression following if statement must evaluate to boolean", line_num=it.ip_)
+
+def _if_taken(it, ins):
+  it.block_stk.append(IfBlock(ins[2], True))
+  it.ip_ = ins[NEXT_IDX]
+
+def _if_skipped(it, ins):
+  it.block_stk.append(IfBlock(ins[2], False))
+  it.ip_ = ins[3]
+
+def _else(it, ins):
+  if not it.block_stk:
+    it.error(ErrorType.SYNTAX_ERROR, description="mismatched else statement", line_num=it.ip_)
+  # skip the else body if the if branch was taken
+  top = it.block_stk[-1]
+  it.ip_ = ins[2] if top.kind != InterpreterBase.IF_DEF or top.taken else ins[NEXT_IDX]
+
+def _endif(it, ins):
+  block_stk = it.block_stk
+  if not block_stk or block_stk[-1].kind != InterpreterBase.IF_DEF or block_stk[-1].indent != ins[2]:
+    it.error(ErrorType.SYNTAX_ERROR, description="mismatched endif statement", line_num=it.ip_)
+  block_stk.pop()
+  it.ip_ = ins[NEXT_IDX]
+
+def _while(it, ins):
+  block_stk = it.block_stk
+  if not block_stk or block_stk[-1].kind != InterpreterBase.WHILE_DEF or block_stk[-1].while_ip != it.ip_:
+    block_stk.append(WhileBlock(ins[2], it.ip_, ins[4]))
+  expr_res = ins[3](it)
+  if expr_res == True:
+    it.ip_ = ins[NEXT_IDX]
+  elif expr_res == False:
+    it.ip_ = ins[4]
+    block_stk.pop()
+  else:
+    it.error(ErrorType.TYPE_ERROR, description=f"expression following while statement must evaluate to boolean", line_num=it.ip_)
+
+def _endwhile(it, ins):
+  block_stk = it.block_stk
+  if not block_stk or block_stk[-1].kind != InterpreterBase.WHILE_DEF or block_stk[-1].indent != ins[2]:
+    it.error(ErrorType.SYNTAX_ERROR, description="mismatched endwhile statement", line_num=it.ip_)
+  it.ip_ = block_stk[-1].while_ip
+
+def _load(it, ins):
+  # Program.load_function replaces this instruction (and the rest of its function's), so run the real one
+  program = it.program
+  program.load_function(ins[2])
+  ins = it.code[it.ip_]
+  if ins[OP_IDX] == LOAD:
+    # code compiled while another thread loaded the unit, compile the line here instead
+    counted = it.code is program.counted_code
+    ins = it.code[it.ip_] = compile_line(program, it.ip_, range(len(program.lines)+1) if counted else program.skip, counted)
+  HANDLERS[ins[OP_IDX]](it, ins)
+
+def _assign(it, ins):
+  it.values[ins[2]] = ins[3](it)
+  it.ip_ = ins[NEXT_IDX]
+
+HANDLERS = [_nop, _spin, _raise_error, _nop, _funccall, _call, _return, _endfunc, _strtoint,
+            _input, _print, _if, _else, _endif, _while, _endwhile, _assign, _tailcall,
+            _if_taken, _if_skipped, _load]